@@ -0,0 +1,47 @@
+"""
+压测脚本共用的小工具：资源采样和模拟的 gr.Request
+
+benchmarks/load_driver.py 和 week2/13_code/bench_async.py 都从这里导入，只依赖标准库
+"""
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+
+class ResourceMonitor:
+    """后台采样线程数与进程常驻内存（RSS）的峰值"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak_threads = 0
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            self.peak_rss = max(self.peak_rss, current_rss())
+            time.sleep(self.interval)
+
+
+def current_rss() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def new_request(session_id: str):
+    # 模拟 gr.Request：匿名用户，会话ID 由调用方指定
+    return SimpleNamespace(username=None, session_hash=session_id)
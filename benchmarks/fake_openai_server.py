@@ -0,0 +1,225 @@
+"""
+本地的 OpenAI 兼容假模型服务，用于离线压测，不需要访问 DashScope
+
+- POST /v1/chat/completions：支持流式（SSE）和非流式，按固定速率逐 token 输出
+- 请求里带 enable_thinking（extra_body）时，先输出 reasoning_content 增量，和百炼的深度思考模型一致
+- GET /stats：服务端累计的请求数、输出 token 数，压测脚本用它计算吞吐
+
+用法：
+    python fake_openai_server.py --port 8765 --ttft 0.3 --tokens-per-second 50
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 python ../week2/13_code/lingua_mate_v5.py
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = (
+    "Good try! The correct sentence is: I went to school yesterday. "
+    "We use went because go is an irregular verb. "
+    "Can you tell me what you did last weekend?"
+)
+REASONING = (
+    "The learner used goed, which is a common mistake with irregular verbs. "
+    "I should show the correct form first and then give a short reason."
+)
+
+
+@dataclass
+class FakeModelConfig:
+    ttft: float = 0.3               # 收到请求到第一个 token 的延迟（秒）
+    tokens_per_second: float = 50   # 之后的输出速率
+    reply_tokens: int = 40          # 每次回答输出的 token 数
+    reasoning_tokens: int = 40      # 开启深度思考时额外输出的思考 token 数
+    jitter: float = 0.0             # 延迟随机抖动比例，0.1 表示 ±10%
+    error_rate: float = 0.0         # 按该比例随机返回 503，用于测试重试逻辑
+
+
+class Counters:
+    def __init__(self):
+        self.requests = 0
+        self.active = 0
+        self.peak_active = 0
+        self.tokens = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def add(self, **deltas):
+        with self._lock:
+            for name, value in deltas.items():
+                setattr(self, name, getattr(self, name) + value)
+            self.peak_active = max(self.peak_active, self.active)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"requests": self.requests, "active": self.active, "peak_active": self.peak_active,
+                    "tokens": self.tokens, "errors": self.errors}
+
+
+def take_tokens(text: str, n: int) -> list[str]:
+    """把示例文本按词循环切成 n 个 token"""
+    return [word + " " for word in itertools.islice(itertools.cycle(text.split(" ")), n)]
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 + chunked 编码，客户端的 keep-alive 连接池才能真正复用连接
+    protocol_version = "HTTP/1.1"
+    config = FakeModelConfig()
+    counters = Counters()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json({"object": "list", "data": [{"id": "fake", "object": "model"}]})
+        elif self.path.rstrip("/").endswith("/stats"):
+            self._send_json(self.counters.snapshot())
+        else:
+            self._send_json({"status": "ok"})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json({"error": {"message": f"unknown path {self.path}"}}, status=404)
+            return
+        if random.random() < self.config.error_rate:
+            self.counters.add(errors=1)
+            self._send_json({"error": {"message": "fake overload", "type": "server_error"}}, status=503)
+            return
+
+        self.counters.add(requests=1, active=1)
+        try:
+            if body.get("stream"):
+                self._stream_completion(body)
+            else:
+                self._completion(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端提前断开（比如用户关掉了页面），不算服务端错误
+            pass
+        finally:
+            self.counters.add(active=-1)
+
+    def _plan(self, body: dict) -> tuple[list[str], list[str]]:
+        reasoning = take_tokens(REASONING, self.config.reasoning_tokens) if body.get("enable_thinking") else []
+        return reasoning, take_tokens(REPLY, self.config.reply_tokens)
+
+    def _sleep(self, seconds: float):
+        if self.config.jitter:
+            seconds *= 1 + random.uniform(-self.config.jitter, self.config.jitter)
+        time.sleep(max(0.0, seconds))
+
+    def _completion(self, body: dict):
+        reasoning, answer = self._plan(body)
+        tokens = len(reasoning) + len(answer)
+        self._sleep(self.config.ttft + max(0, tokens - 1) / self.config.tokens_per_second)
+        self.counters.add(tokens=tokens)
+        message = {"role": "assistant", "content": "".join(answer).strip()}
+        if reasoning:
+            message["reasoning_content"] = "".join(reasoning).strip()
+        self._send_json({
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+            "usage": self._usage(body, tokens),
+        })
+
+    def _stream_completion(self, body: dict):
+        reasoning, answer = self._plan(body)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        def chunk(delta: dict, finish_reason=None) -> dict:
+            return {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                    "model": body.get("model", "fake"),
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        self._sleep(self.config.ttft)
+        self._send_event(chunk({"role": "assistant", "content": ""}))
+        deltas = [{"content": "", "reasoning_content": token} for token in reasoning] + \
+                 [{"content": token} for token in answer]
+        for i, delta in enumerate(deltas):
+            if i:
+                self._sleep(1 / self.config.tokens_per_second)
+            self._send_event(chunk(delta))
+            self.counters.add(tokens=1)
+        self._send_event(chunk({}, finish_reason="stop"))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            self._send_event({"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                              "model": body.get("model", "fake"), "choices": [],
+                              "usage": self._usage(body, len(deltas))})
+        self._send_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _usage(self, body: dict, completion_tokens: int) -> dict:
+        # 粗略估算：4 个字符约等于 1 个 token
+        prompt_tokens = len(json.dumps(body.get("messages", []), ensure_ascii=False)) // 4
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def _send_event(self, payload):
+        data = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+        event = f"data: {data}\n\n".encode()
+        self.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, payload: dict, status: int = 200):
+        data = json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # 默认 backlog 只有 5，几百个并发连接同时建连会被拒绝
+    request_queue_size = 1024
+
+
+def make_server(host: str, port: int, config: FakeModelConfig) -> FakeOpenAIServer:
+    FakeOpenAIHandler.config = config
+    FakeOpenAIHandler.counters = Counters()
+    return FakeOpenAIServer((host, port), FakeOpenAIHandler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible streaming server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft", type=float, default=0.3, help="首 token 延迟（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=50)
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--reasoning-tokens", type=int, default=40)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = FakeModelConfig(args.ttft, args.tokens_per_second, args.reply_tokens,
+                             args.reasoning_tokens, args.jitter, args.error_rate)
+    server = make_server(args.host, args.port, config)
+    print(f"fake OpenAI server listening on http://{args.host}:{server.server_port}/v1 ({config})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
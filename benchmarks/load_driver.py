@@ -0,0 +1,272 @@
+"""
+离线压测：启动本地假模型服务（fake_openai_server.py），对示例应用发起并发会话，
+统计首 token 延迟（TTFT）、端到端耗时的 p50 / p99、输出吞吐，以及每个并发会话的 CPU / 内存开销
+
+场景：
+- stream: week2/11_code/stream_example.py 中的 llm.stream / astream
+- v4:     week2/12_code/lingua_mate_v4.py 的 reply_and_speak / areply_and_speak（TTS 使用本地 stub）
+- v5:     week2/13_code/lingua_mate_v5.py 的 chat_handler / achat_handler
+- agent:  week4/27_code/agent.py 的 agent.stream / astream
+
+用法：
+    python load_driver.py v5 --sessions 100 --mode async --deep-thinking
+    python load_driver.py agent --sessions 20 --mode sync --tokens-per-second 30
+    python load_driver.py stream --base-url http://127.0.0.1:8765/v1   # 使用已经启动的假模型服务
+"""
+import argparse
+import asyncio
+import contextlib
+import importlib
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Callable, Iterator
+
+from bench_utils import ResourceMonitor, current_rss, new_request
+
+ROOT = Path(__file__).resolve().parent.parent
+SERVER_SCRIPT = Path(__file__).resolve().parent / "fake_openai_server.py"
+
+USER_MESSAGE = "I goed to school yesterday"
+
+
+@dataclass
+class Scenario:
+    directory: Path
+    module: str
+    # 每个会话产出一次 = 用户看到了一次新的输出，驱动脚本只关心第一次和最后一次的时间
+    run_sync: Callable[..., Iterator]
+    run_async: Callable[..., AsyncIterator]
+    # agent 通过相对路径加载 skills 目录，需要在源码目录下运行；其余场景会写文件，放到临时目录
+    run_in_source_dir: bool = False
+
+
+def stream_sync(app, i, args):
+    for chunk in app.llm.stream(USER_MESSAGE):
+        if chunk.content:
+            yield
+
+
+async def stream_async(app, i, args):
+    async for chunk in app.llm.astream(USER_MESSAGE):
+        if chunk.content:
+            yield
+
+
+def v4_sync(app, i, args):
+    for history, audio in app.reply_and_speak(USER_MESSAGE, [], new_request(f"load_{i}")):
+        if audio or history[-1]["content"]:
+            yield
+
+
+async def v4_async(app, i, args):
+    async for history, audio in app.areply_and_speak(USER_MESSAGE, [], new_request(f"load_{i}")):
+        if audio or history[-1]["content"]:
+            yield
+
+
+def v5_sync(app, i, args):
+    for _ in app.chat_handler(USER_MESSAGE, [], args.deep_thinking, new_request(f"load_{i}")):
+        yield
+
+
+async def v5_async(app, i, args):
+    async for _ in app.achat_handler(USER_MESSAGE, [], args.deep_thinking, new_request(f"load_{i}")):
+        yield
+
+
+def agent_input():
+    return {"messages": [{"role": "user", "content": USER_MESSAGE}]}
+
+
+def agent_sync(app, i, args):
+    for chunk, _ in app.agent.stream(agent_input(), stream_mode="messages"):
+        if chunk.content:
+            yield
+
+
+async def agent_async(app, i, args):
+    async for chunk, _ in app.agent.astream(agent_input(), stream_mode="messages"):
+        if chunk.content:
+            yield
+
+
+SCENARIOS = {
+    "stream": Scenario(ROOT / "week2" / "11_code", "stream_example", stream_sync, stream_async),
+    "v4": Scenario(ROOT / "week2" / "12_code", "lingua_mate_v4", v4_sync, v4_async),
+    "v5": Scenario(ROOT / "week2" / "13_code", "lingua_mate_v5", v5_sync, v5_async),
+    "agent": Scenario(ROOT / "week4" / "27_code", "agent", agent_sync, agent_async, run_in_source_dir=True),
+}
+
+
+@dataclass
+class SessionResult:
+    ttft: float | None = None
+    latency: float = 0.0
+    error: str | None = None
+
+
+def timed_sync(outputs: Iterator) -> SessionResult:
+    result = SessionResult()
+    start = time.perf_counter()
+    try:
+        for _ in outputs:
+            if result.ttft is None:
+                result.ttft = time.perf_counter() - start
+    except Exception as e:
+        result.error = repr(e)
+    result.latency = time.perf_counter() - start
+    return result
+
+
+async def timed_async(outputs: AsyncIterator) -> SessionResult:
+    result = SessionResult()
+    start = time.perf_counter()
+    try:
+        async for _ in outputs:
+            if result.ttft is None:
+                result.ttft = time.perf_counter() - start
+    except Exception as e:
+        result.error = repr(e)
+    result.latency = time.perf_counter() - start
+    return result
+
+
+def run_sessions(scenario: Scenario, app, args, first_id: int, sessions: int) -> list[SessionResult]:
+    ids = range(first_id, first_id + sessions)
+    if args.mode == "sync":
+        # 和 Gradio 的同步 handler 一样：每个进行中的会话占用一个工作线程
+        with ThreadPoolExecutor(max_workers=sessions) as executor:
+            return list(executor.map(lambda i: timed_sync(scenario.run_sync(app, i, args)), ids))
+
+    async def main():
+        return await asyncio.gather(*(timed_async(scenario.run_async(app, i, args)) for i in ids))
+
+    return asyncio.run(main())
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else float("nan")
+
+
+def server_stats(base_url: str) -> dict:
+    with urllib.request.urlopen(f"{base_url}/stats", timeout=5) as response:
+        return json.load(response)
+
+
+@contextlib.contextmanager
+def fake_server(args):
+    """没有指定 --base-url 时，在子进程里启动假模型服务，它的开销不计入被测进程"""
+    if args.base_url:
+        yield args.base_url
+        return
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    process = subprocess.Popen([
+        sys.executable, str(SERVER_SCRIPT), "--port", str(port),
+        "--ttft", str(args.ttft), "--tokens-per-second", str(args.tokens_per_second),
+        "--reply-tokens", str(args.reply_tokens), "--reasoning-tokens", str(args.reasoning_tokens),
+        "--jitter", str(args.jitter),
+    ], stdout=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}/v1"
+    try:
+        for _ in range(100):
+            try:
+                server_stats(base_url)
+                break
+            except OSError:
+                time.sleep(0.05)
+        else:
+            raise RuntimeError("fake OpenAI server did not start")
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def load_app(scenario: Scenario, workdir: str):
+    sys.path.insert(0, str(scenario.directory))
+    os.chdir(scenario.directory if scenario.run_in_source_dir else workdir)
+    # 应用在导入时会打印系统提示词等信息，压测时不需要
+    with contextlib.redirect_stdout(io.StringIO()):
+        return importlib.import_module(scenario.module)
+
+
+def report(args, results: list[SessionResult], wall: float, cpu: float, monitor: ResourceMonitor,
+           base_rss: int, server: dict):
+    ok = [r for r in results if r.error is None and r.ttft is not None]
+    errors = [r for r in results if r.error is not None]
+    ttfts = [r.ttft for r in ok]
+    latencies = [r.latency for r in ok]
+    tokens_per_session = server["tokens"] / len(results)
+    # 单个会话的输出速率：首 token 之后的平均 token/s（token 数取服务端统计的平均值）
+    rates = [tokens_per_session / (r.latency - r.ttft) for r in ok if r.latency > r.ttft]
+
+    print(f"scenario={args.scenario} mode={args.mode} sessions={args.sessions} "
+          f"wall={wall:.2f}s ok={len(ok)} errors={len(errors)}")
+    print(f"ttft      p50={percentile(ttfts, 0.5):.3f}s p99={percentile(ttfts, 0.99):.3f}s")
+    print(f"latency   p50={percentile(latencies, 0.5):.3f}s p99={percentile(latencies, 0.99):.3f}s")
+    print(f"tokens    total={server['tokens']} aggregate={server['tokens'] / wall:.1f} tok/s "
+          f"per_session_p50={percentile(rates, 0.5):.1f} tok/s")
+    print(f"resources cpu/session={cpu / len(results) * 1000:.1f}ms "
+          f"rss/session={max(0, monitor.peak_rss - base_rss) / len(results) / 1024:.1f}KB "
+          f"peak_threads={monitor.peak_threads}")
+    print(f"server    requests={server['requests']} peak_active={server['peak_active']}")
+    if errors:
+        print(f"first error: {errors[0].error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline load test against a fake OpenAI-compatible server")
+    parser.add_argument("scenario", choices=sorted(SCENARIOS))
+    parser.add_argument("--sessions", type=int, default=50, help="并发会话数")
+    parser.add_argument("--mode", choices=["sync", "async"], default="async")
+    parser.add_argument("--deep-thinking", action="store_true", help="v5：开启深度思考，假模型会输出 reasoning_content")
+    parser.add_argument("--base-url", help="使用已经启动的假模型服务，不指定则自动启动")
+    parser.add_argument("--ttft", type=float, default=0.3, help="假模型首 token 延迟（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=50)
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--reasoning-tokens", type=int, default=40)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    args = parser.parse_args()
+
+    scenario = SCENARIOS[args.scenario]
+    with fake_server(args) as base_url, tempfile.TemporaryDirectory() as workdir:
+        # 必须在导入应用之前设置：各应用在导入时读取这些环境变量
+        os.environ["OPENAI_BASE_URL"] = base_url
+        os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+        os.environ.setdefault("TTS_BACKEND", "stub")
+        app = load_app(scenario, workdir)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            # 先跑一个会话预热：导入、建 chain、建连接池的开销不计入结果
+            run_sessions(scenario, app, args, first_id=-1, sessions=1)
+
+            before = server_stats(base_url)
+            base_rss = current_rss()
+            cpu_start = time.process_time()
+            start = time.perf_counter()
+            with ResourceMonitor() as monitor:
+                results = run_sessions(scenario, app, args, first_id=0, sessions=args.sessions)
+            wall = time.perf_counter() - start
+            cpu = time.process_time() - cpu_start
+            after = server_stats(base_url)
+
+        server = {
+            "requests": after["requests"] - before["requests"],
+            "tokens": after["tokens"] - before["tokens"],
+            "peak_active": after["peak_active"],
+        }
+        report(args, results, wall, cpu, monitor, base_rss, server)
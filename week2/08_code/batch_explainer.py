@@ -0,0 +1,175 @@
+"""
+批量生成英文学习内容
+
+从文件读取主题（每行一个），并发调用 explainer.py 中的 prompt | model | output_parser，
+结果逐条追加写入 JSONL。输出文件同时也是断点：中断后重新运行会跳过已经成功的主题。
+
+用法：
+    python batch_explainer.py topics.txt results.jsonl --concurrency 16 --rps 5
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+
+from langchain_openai.chat_models import ChatOpenAI
+
+from explainer import model, output_parser, prompt
+
+# 重试由 generate() 统一控制（带退避，每次重试都经过限流），关掉 SDK 自带的重试，否则实际重试次数会相乘
+batch_model = ChatOpenAI(model=model.model_name, base_url=model.openai_api_base, max_retries=0)
+chain = prompt | batch_model | output_parser
+
+
+class RateLimiter:
+    """令牌桶限流：平均每秒最多放行 rate 个请求，允许 burst 个突发"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError(f"rate 必须大于 0：{rate}")
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def positive_float(value: str) -> float:
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"必须大于 0：{value}")
+    return number
+
+
+def load_topics(path: Path) -> list[str]:
+    topics = []
+    seen = set()
+    for line in path.read_text(encoding="utf-8").splitlines():
+        topic = line.strip()
+        if topic and topic not in seen:
+            seen.add(topic)
+            topics.append(topic)
+    return topics
+
+
+def load_finished(path: Path) -> set[str]:
+    """读取已有的输出文件，返回已经成功生成的主题"""
+    finished = set()
+    if not path.exists():
+        return finished
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            # 上次中断时可能写了半行，忽略即可
+            continue
+        if record.get("status") == "ok":
+            finished.add(record["topic"])
+    return finished
+
+
+def truncate_partial_line(path: Path):
+    """上次中断时最后一行可能只写了一半，续跑前截掉它，否则新结果会接在半行后面变成无法解析的一行"""
+    if not path.exists():
+        return
+    with path.open("rb+") as f:
+        data = f.read()
+        if not data or data.endswith(b"\n"):
+            return
+        f.truncate(data.rfind(b"\n") + 1)
+
+
+async def generate(topic: str, limiter: RateLimiter, retries: int) -> tuple[str, int]:
+    """带重试（指数退避 + 随机抖动）地生成一个主题，返回 (内容, 尝试次数)"""
+    for attempt in range(1, retries + 2):
+        await limiter.acquire()
+        try:
+            return await chain.ainvoke({"topic": topic}), attempt
+        except Exception:
+            if attempt > retries:
+                raise
+            await asyncio.sleep(min(30.0, 2 ** (attempt - 1)) * (0.5 + random.random()))
+
+
+async def run_batch(topics: list[str], output: Path, concurrency: int, rps: float, retries: int) -> dict:
+    queue: asyncio.Queue[str] = asyncio.Queue()
+    for topic in topics:
+        queue.put_nowait(topic)
+
+    # 突发上限不超过每秒配额，否则启动瞬间会有 concurrency 个请求同时打到服务端；rps 小于 1 时至少允许 1 个
+    limiter = RateLimiter(rps, burst=max(1, min(concurrency, int(rps))))
+    latencies = []
+    summary = {"ok": 0, "failed": 0, "retries": 0}
+
+    truncate_partial_line(output)
+    with output.open("a", encoding="utf-8") as out:
+        async def worker():
+            while True:
+                try:
+                    topic = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                start = time.perf_counter()
+                try:
+                    content, attempts = await generate(topic, limiter, retries)
+                    record = {"topic": topic, "status": "ok", "content": content}
+                    summary["ok"] += 1
+                    summary["retries"] += attempts - 1
+                except Exception as e:
+                    record = {"topic": topic, "status": "failed", "error": repr(e)}
+                    summary["failed"] += 1
+                    summary["retries"] += retries
+                latency = time.perf_counter() - start
+                latencies.append(latency)
+                record["latency"] = round(latency, 3)
+                # 每条结果立即落盘，随时中断都不会丢已完成的主题
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                done = summary["ok"] + summary["failed"]
+                print(f"[{done}/{len(topics)}] {record['status']:<6} {topic} ({latency:.1f}s)")
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    if latencies:
+        ordered = sorted(latencies)
+        summary["p50_latency"] = statistics.median(ordered)
+        summary["p95_latency"] = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch English content generation")
+    parser.add_argument("topics", type=Path, help="主题文件，每行一个主题")
+    parser.add_argument("output", type=Path, help="输出 JSONL 文件（同时作为断点续跑的进度记录）")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时进行的请求数")
+    parser.add_argument("--rps", type=positive_float, default=5, help="每秒最多发起的请求数，可以是小数")
+    parser.add_argument("--retries", type=int, default=3, help="单个主题失败后的重试次数")
+    args = parser.parse_args()
+
+    topics = load_topics(args.topics)
+    finished = load_finished(args.output)
+    pending = [t for t in topics if t not in finished]
+    print(f"共 {len(topics)} 个主题，已完成 {len(topics) - len(pending)} 个，本次处理 {len(pending)} 个")
+
+    start = time.perf_counter()
+    summary = asyncio.run(run_batch(pending, args.output, args.concurrency, args.rps, args.retries))
+    elapsed = time.perf_counter() - start
+
+    print(f"\n完成：成功 {summary['ok']}，失败 {summary['failed']}，重试 {summary['retries']} 次")
+    print(f"耗时 {elapsed:.1f}s，吞吐 {summary['ok'] / elapsed if elapsed else 0:.2f} topics/s")
+    if "p50_latency" in summary:
+        print(f"单个主题耗时 p50={summary['p50_latency']:.2f}s p95={summary['p95_latency']:.2f}s")
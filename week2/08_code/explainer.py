@@ -17,5 +17,6 @@ output_parser = StrOutputParser()
 # 使用 LCEL 表达式将 prompt、model、parser 串联起来
 chain = prompt | model | output_parser
 
-result = chain.invoke({"topic": "climate change"})
-print(result)
\ No newline at end of file
+if __name__ == "__main__":
+    result = chain.invoke({"topic": "climate change"})
+    print(result)
\ No newline at end of file
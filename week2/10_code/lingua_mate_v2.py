@@ -2,10 +2,10 @@ import gradio as gr
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_openai.chat_models import ChatOpenAI
 from langchain_core.output_parsers import StrOutputParser
-from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
 import os
 from dotenv import load_dotenv
+from session_store import SessionStore
 
 load_dotenv()
 
@@ -13,13 +13,11 @@ assert os.getenv("OPENAI_API_KEY"), "请先配置 OPENAI_API_KEY"
 
 
 
-# 存储不同用户的记忆
-store = {}
+# 存储不同用户的记忆：内存里只保留最近活跃的会话，全部历史落盘到 SQLite，重启后可恢复
+store = SessionStore("sessions.db", max_sessions=1000, ttl_seconds=1800)
 
 def get_session_history(session_id: str):
-    if session_id not in store:
-        store[session_id] = ChatMessageHistory()
-    return store[session_id]
+    return store.get(session_id)
 
 
 english_tutor_prompt = ChatPromptTemplate.from_messages([
@@ -67,7 +65,15 @@ def get_ai_response(user_message: str, session_id: str) -> str:
     return response
 
 
-def chat_handler(message: str, history: list) -> str:
+def get_session_id(request: gr.Request) -> str:
+    """
+    登录用户用用户名作为会话ID（重启后还能找回历史），
+    否则每个浏览器连接一个独立会话
+    """
+    return request.username or request.session_hash
+
+
+def chat_handler(message: str, history: list, request: gr.Request) -> str:
     """
     Gradio ChatInterface 的回调函数
     负责：
@@ -75,8 +81,10 @@ def chat_handler(message: str, history: list) -> str:
     2. 调用 LLM 生成回复
     3. 返回给前端展示
     """
-    session_id = "user_001"  # 在实际应用中，应根据用户身份动态生成
-    return get_ai_response(message, session_id)
+    session_id = get_session_id(request)
+    # 同一用户的多条消息排队执行，避免并发读写同一份历史
+    with store.lock(session_id):
+        return get_ai_response(message, session_id)
 
 
 # 使用 Gradio 专门为聊天机器人设计的高层接口
@@ -87,5 +95,11 @@ chat_ui = gr.ChatInterface(
 )
 
 
+# 并发配置：不同用户的请求并行处理；排队请求超过 MAX_QUEUE_SIZE 时直接拒绝新请求（背压）
+CONCURRENCY_LIMIT = int(os.getenv("CONCURRENCY_LIMIT", "16"))
+MAX_QUEUE_SIZE = int(os.getenv("MAX_QUEUE_SIZE", "64"))
+
+
 if __name__ == "__main__":
-    chat_ui.launch(share=True)  # share=True 会生成公网访问链接
\ No newline at end of file
+    chat_ui.queue(default_concurrency_limit=CONCURRENCY_LIMIT, max_size=MAX_QUEUE_SIZE)
+    chat_ui.launch(share=True, max_threads=max(40, CONCURRENCY_LIMIT))  # share=True 会生成公网访问链接
\ No newline at end of file
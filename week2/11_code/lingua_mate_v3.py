@@ -2,24 +2,27 @@ import gradio as gr
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_openai.chat_models import ChatOpenAI
 from langchain_core.output_parsers import StrOutputParser
-from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
+import logging
 import os
 from dotenv import load_dotenv
+from session_store import SessionStore
+from streaming import StreamStats, coalesce
 
 load_dotenv()
 
 assert os.getenv("OPENAI_API_KEY"), "请先配置 OPENAI_API_KEY"
 
+# 每轮回复的推送统计只在调试时输出，默认不刷屏
+logger = logging.getLogger(__name__)
 
 
-# 存储不同用户的记忆
-store = {}
+
+# 存储不同用户的记忆：内存里只保留最近活跃的会话，全部历史落盘到 SQLite，重启后可恢复
+store = SessionStore("sessions.db", max_sessions=1000, ttl_seconds=1800)
 
 def get_session_history(session_id: str):
-    if session_id not in store:
-        store[session_id] = ChatMessageHistory()
-    return store[session_id]
+    return store.get(session_id)
 
 
 english_tutor_prompt = ChatPromptTemplate.from_messages([
@@ -53,6 +56,20 @@ chain_with_history = RunnableWithMessageHistory(
     history_messages_key="chat_history",
 )
 
+def stream_ai_deltas(user_message: str, session_id: str, stats: StreamStats | None = None):
+    """
+    调用大模型，只产出增量帧（多个 token 合并成一帧）
+    - user_message: 当前用户输入
+    - session_id: 会话ID（用于区分不同用户）
+    - stats: 可选，用于统计本次回复推送的帧数与字节数
+    """
+    chunks = chain_with_history.stream(
+        {"user_message": user_message},
+        config={"configurable": {"session_id": session_id}}
+    )
+    yield from coalesce((("", chunk) for chunk in chunks if chunk), stats=stats)
+
+
 def stream_ai_response(user_message: str, session_id: str):
     """
     调用大模型，生成回复内容
@@ -61,17 +78,25 @@ def stream_ai_response(user_message: str, session_id: str):
     """
    
     partial_answer = ""
+    stats = StreamStats()
 
-    for chunk in chain_with_history.stream(
-        {"user_message": user_message},
-        config={"configurable": {"session_id": session_id}}
-    ):
-        if chunk:
-            partial_answer += chunk
-            yield partial_answer
+    # Gradio 的 ChatInterface 需要完整文本，这里按帧（而不是按 token）推送
+    for frame in stream_ai_deltas(user_message, session_id, stats):
+        partial_answer += frame.answer
+        yield partial_answer
+
+    logger.debug("[stream] %s", stats.summary())
 
 
-def chat_handler(message: str, history: list):
+def get_session_id(request: gr.Request) -> str:
+    """
+    登录用户用用户名作为会话ID（重启后还能找回历史），
+    否则每个浏览器连接一个独立会话
+    """
+    return request.username or request.session_hash
+
+
+def chat_handler(message: str, history: list, request: gr.Request):
     """
     Gradio ChatInterface 的回调函数
     负责：
@@ -79,9 +104,11 @@ def chat_handler(message: str, history: list):
     2. 调用 LLM 生成回复
     3. 返回给前端展示
     """
-    session_id = "user_001"  # 在实际应用中，应根据用户身份动态生成
-    for partial in stream_ai_response(message, session_id):
-        yield partial
+    session_id = get_session_id(request)
+    # 同一用户的多条消息排队执行，避免并发读写同一份历史
+    with store.lock(session_id):
+        for partial in stream_ai_response(message, session_id):
+            yield partial
 
 
 # 使用 Gradio 专门为聊天机器人设计的高层接口
@@ -92,5 +119,11 @@ chat_ui = gr.ChatInterface(
 )
 
 
+# 并发配置：不同用户的请求并行处理；排队请求超过 MAX_QUEUE_SIZE 时直接拒绝新请求（背压）
+CONCURRENCY_LIMIT = int(os.getenv("CONCURRENCY_LIMIT", "16"))
+MAX_QUEUE_SIZE = int(os.getenv("MAX_QUEUE_SIZE", "64"))
+
+
 if __name__ == "__main__":
-    chat_ui.launch(share=True)  # share=True 会生成公网访问链接
\ No newline at end of file
+    chat_ui.queue(default_concurrency_limit=CONCURRENCY_LIMIT, max_size=MAX_QUEUE_SIZE)
+    chat_ui.launch(share=True, max_threads=max(40, CONCURRENCY_LIMIT))  # share=True 会生成公网访问链接
\ No newline at end of file
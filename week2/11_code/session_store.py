@@ -0,0 +1,175 @@
+"""
+有界、可持久化的会话存储
+
+- 内存层：按最近访问排序的 LRU，超过 max_sessions 或空闲超过 ttl_seconds 的会话会被移出内存
+- 持久层：本地 SQLite，每条消息追加写一行，被移出内存或进程重启后按需加载回来
+"""
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+# 用单字符记录消息类型，让落盘的数据尽量紧凑
+_MESSAGE_CLASSES = {"h": HumanMessage, "a": AIMessage, "s": SystemMessage}
+
+
+def _type_code(message: BaseMessage) -> str:
+    # 按类判断而不是看 message.type：流式输出拼出来的 AIMessageChunk 的 type 是 "AIMessageChunk"，
+    # 但它是 AIMessage 的子类，要按 AI 消息保存
+    for type_code, cls in _MESSAGE_CLASSES.items():
+        if isinstance(message, cls):
+            return type_code
+    raise ValueError(f"不支持持久化的消息类型：{type(message).__name__}")
+
+
+class PersistentChatMessageHistory(BaseChatMessageHistory):
+    """
+    写穿（write-through）的对话历史：新增消息同时写入 SQLite，
+    所以即使它已经被移出内存，正在进行中的对话也不会丢消息
+    """
+
+    def __init__(self, session_id: str, store: "SessionStore", messages: list[BaseMessage]):
+        self.session_id = session_id
+        self.store = store
+        self.messages = messages
+
+    def add_messages(self, messages) -> None:
+        messages = list(messages)
+        # 先落盘：遇到不支持的消息类型时直接报错，内存和 SQLite 不会不一致
+        self.store._append(self.session_id, messages)
+        self.messages.extend(messages)
+
+    def clear(self) -> None:
+        self.messages = []
+        self.store._delete(self.session_id)
+
+
+class SessionStore:
+    def __init__(self, db_path: str = "sessions.db", max_sessions: int = 1000, ttl_seconds: float = 1800):
+        self.db_path = Path(db_path)
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+
+        # session_id -> (最近访问时间, 对话历史)
+        self._cache: OrderedDict[str, tuple[float, PersistentChatMessageHistory]] = OrderedDict()
+        self._lock = threading.Lock()
+        # 每个会话一把锁；没有人持有时自动回收，不会随会话数无限增长
+        self._session_locks: weakref.WeakValueDictionary[str, threading.Lock] = weakref.WeakValueDictionary()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " session_id TEXT NOT NULL,"
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " type TEXT NOT NULL,"
+            " content TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, seq)")
+        self._db.commit()
+
+    def get(self, session_id: str) -> PersistentChatMessageHistory:
+        """获取会话历史：优先命中内存，否则从 SQLite 加载"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.pop(session_id, None)
+            if entry is not None and now - entry[0] <= self.ttl_seconds:
+                self.hits += 1
+                history = entry[1]
+            else:
+                self.misses += 1
+                history = PersistentChatMessageHistory(session_id, self, self._load(session_id))
+            self._cache[session_id] = (now, history)
+            self._evict(now)
+        return history
+
+    def lock(self, session_id: str) -> threading.Lock:
+        """同一会话的多轮对话串行执行，不同会话之间互不阻塞"""
+        with self._lock:
+            session_lock = self._session_locks.get(session_id)
+            if session_lock is None:
+                session_lock = threading.Lock()
+                self._session_locks[session_id] = session_lock
+            return session_lock
+
+    def stats(self) -> dict:
+        """内存占用等统计信息"""
+        with self._lock:
+            messages = sum(len(history.messages) for _, history in self._cache.values())
+            content_bytes = sum(
+                len(str(m.content).encode()) for _, history in self._cache.values() for m in history.messages
+            )
+            cached_sessions = len(self._cache)
+            stored_sessions = self._db.execute("SELECT COUNT(DISTINCT session_id) FROM messages").fetchone()[0]
+        return {
+            "cached_sessions": cached_sessions,
+            "cached_messages": messages,
+            "cached_content_bytes": content_bytes,
+            "stored_sessions": stored_sessions,
+            "db_bytes": self.db_path.stat().st_size if self.db_path.exists() else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _evict(self, now: float):
+        # OrderedDict 按最近访问排序，过期的会话一定在最前面
+        while self._cache:
+            session_id, (last_access, _) = next(iter(self._cache.items()))
+            if len(self._cache) <= self.max_sessions and now - last_access <= self.ttl_seconds:
+                break
+            del self._cache[session_id]
+            self.evictions += 1
+
+    def _load(self, session_id: str) -> list[BaseMessage]:
+        rows = self._db.execute(
+            "SELECT type, content FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+        ).fetchall()
+        return [_MESSAGE_CLASSES[type_code](content=content) for type_code, content in rows]
+
+    def _append(self, session_id: str, messages: list[BaseMessage]):
+        rows = [
+            (session_id, _type_code(m), m.content if isinstance(m.content, str) else str(m.content))
+            for m in messages
+        ]
+        with self._lock:
+            self._db.executemany("INSERT INTO messages (session_id, type, content) VALUES (?, ?, ?)", rows)
+            self._db.commit()
+
+    def _delete(self, session_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._db.commit()
+
+
+if __name__ == "__main__":
+    # 往返检查：写入 SQLite、清空内存后重新加载，消息类型和内容都要保持不变
+    import tempfile
+
+    from langchain_core.messages import AIMessageChunk, ToolMessage
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SessionStore(f"{tmp}/sessions.db", max_sessions=1)
+        original = [SystemMessage(content="system"), HumanMessage(content="I goed to school"),
+                    AIMessageChunk(content="I went to school"), AIMessage(content="done")]
+        store.get("s1").add_messages(original)
+        store.get("s2")  # max_sessions=1，s1 被移出内存
+        restored = store.get("s1").messages
+        assert [type(m).__name__ for m in restored] == ["SystemMessage", "HumanMessage", "AIMessage", "AIMessage"]
+        assert [m.content for m in restored] == [m.content for m in original]
+        try:
+            store.get("s3").add_messages([ToolMessage(content="x", tool_call_id="1")])
+        except ValueError as e:
+            print(f"rejected: {e}")
+        else:
+            raise AssertionError("unknown message type should be rejected")
+        print("round trip ok")
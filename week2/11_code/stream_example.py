@@ -6,7 +6,8 @@ load_dotenv()
 
 assert os.getenv("OPENAI_API_KEY"), "请先配置 OPENAI_API_KEY"
 
-llm = ChatOpenAI(model="qwen-flash", base_url="https://dashscope.aliyuncs.com/compatible-mode/v1")
+llm = ChatOpenAI(model="qwen-flash", base_url=os.getenv("OPENAI_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"))
 
-for chunk in llm.stream("解释什么是 Agent"):
-    print(chunk.content, end="", flush=True)
+if __name__ == "__main__":
+    for chunk in llm.stream("解释什么是 Agent"):
+        print(chunk.content, end="", flush=True)
@@ -0,0 +1,150 @@
+"""
+流式输出的增量合帧工具
+
+LLM 每吐一个 token 就把「完整的累计文本」推给前端，一次回复推送的数据量是 O(n²)。
+这里把 token 按时间窗口 / 字符数合并成帧，每帧只携带增量（思考、回答两个通道分开），
+并统计一次回复实际推送的帧数与字节数。
+"""
+import contextvars
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+# 默认合帧窗口：距上一帧超过 50ms，或者积攒了 64 个字符，就推送一帧
+FRAME_INTERVAL = 0.05
+FRAME_MAX_CHARS = 64
+
+
+@dataclass
+class StreamFrame:
+    reasoning: str = ""  # 本帧新增的思考内容
+    answer: str = ""     # 本帧新增的回答内容
+
+
+@dataclass
+class StreamStats:
+    chunks: int = 0          # 模型返回的原始 chunk 数
+    frames: int = 0          # 合并后实际推送的帧数
+    delta_bytes: int = 0     # 只推送增量时的字节数
+    snapshot_bytes: int = 0  # 每帧推送全量文本时的字节数
+    naive_bytes: int = 0     # 每个 chunk 都推送全量文本时的字节数（旧方式）
+
+    def summary(self) -> str:
+        return (
+            f"chunks={self.chunks} frames={self.frames} "
+            f"delta_bytes={self.delta_bytes} snapshot_bytes={self.snapshot_bytes} "
+            f"naive_bytes={self.naive_bytes}"
+        )
+
+
+class FrameCoalescer:
+    """
+    合帧器本身不关心数据从哪里来，只负责缓冲和决定什么时候推送
+    - 距上一帧已超过 max_interval 秒，或缓冲区达到 max_chars 个字符时推送一帧
+    - 上游停顿时，调用方按 time_to_flush() 的时间等待，超时后调用 flush()，缓冲的内容不会卡到下一个 chunk
+    - 流结束时调用 flush() 把剩余内容作为最后一帧推送
+    """
+
+    def __init__(self, max_interval: float = FRAME_INTERVAL, max_chars: int = FRAME_MAX_CHARS,
+                 stats: StreamStats | None = None):
+        self.max_interval = max_interval
+        self.max_chars = max_chars
+        self.stats = stats if stats is not None else StreamStats()
+        self._reasoning_buf: list[str] = []
+        self._answer_buf: list[str] = []
+        self._pending = 0
+        self._total_bytes = 0  # 到目前为止的全量文本字节数
+        self._last_flush = 0.0  # 第一个 chunk 总是立即推送，保证首 token 延迟不变
+
+    def push(self, reasoning: str, answer: str) -> StreamFrame | None:
+        """喂入一个 chunk，需要推送时返回一帧，否则返回 None"""
+        if not reasoning and not answer:
+            return None
+        self.stats.chunks += 1
+        self._total_bytes += len(reasoning.encode()) + len(answer.encode())
+        self.stats.naive_bytes += self._total_bytes
+        if reasoning:
+            self._reasoning_buf.append(reasoning)
+        if answer:
+            self._answer_buf.append(answer)
+        self._pending += len(reasoning) + len(answer)
+
+        if self._pending >= self.max_chars or time.monotonic() - self._last_flush >= self.max_interval:
+            return self.flush()
+        return None
+
+    def time_to_flush(self) -> float | None:
+        """缓冲区里有内容时，返回距离必须推送还剩多少秒；缓冲区为空时返回 None（可以一直等）"""
+        if not self._pending:
+            return None
+        return max(0.0, self._last_flush + self.max_interval - time.monotonic())
+
+    def flush(self) -> StreamFrame | None:
+        if not self._pending:
+            return None
+        frame = StreamFrame("".join(self._reasoning_buf), "".join(self._answer_buf))
+        self._reasoning_buf.clear()
+        self._answer_buf.clear()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self.stats.frames += 1
+        self.stats.delta_bytes += len(frame.reasoning.encode()) + len(frame.answer.encode())
+        self.stats.snapshot_bytes += self._total_bytes
+        return frame
+
+
+_END = object()
+
+
+def coalesce(
+    deltas: Iterable[tuple[str, str]],
+    max_interval: float = FRAME_INTERVAL,
+    max_chars: int = FRAME_MAX_CHARS,
+    stats: StreamStats | None = None,
+) -> Iterator[StreamFrame]:
+    """
+    把 (reasoning_delta, answer_delta) 序列合并成增量帧
+    同步迭代器没法带超时地等待下一个 chunk，所以在后台线程里读取上游，这里按合帧窗口带超时地取
+    """
+    coalescer = FrameCoalescer(max_interval, max_chars, stats)
+    items: queue.Queue = queue.Queue()
+    stopped = threading.Event()
+
+    def read():
+        try:
+            for item in deltas:
+                items.put(item)
+                if stopped.is_set():
+                    break
+        except BaseException as e:
+            items.put((_END, e))
+        else:
+            items.put((_END, None))
+        finally:
+            # 调用方提前结束时关闭上游（比如 LLM 的流式请求）
+            if hasattr(deltas, "close"):
+                deltas.close()
+
+    # 复制 contextvars，LangChain 的回调等上下文在读取线程里照样生效
+    threading.Thread(target=contextvars.copy_context().run, args=(read,), daemon=True).start()
+    try:
+        while True:
+            try:
+                item = items.get(timeout=coalescer.time_to_flush())
+            except queue.Empty:
+                yield coalescer.flush()
+                continue
+            if item[0] is _END:
+                if item[1] is not None:
+                    raise item[1]
+                break
+            frame = coalescer.push(*item)
+            if frame:
+                yield frame
+    finally:
+        stopped.set()
+    frame = coalescer.flush()
+    if frame:
+        yield frame
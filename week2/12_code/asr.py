@@ -0,0 +1,252 @@
+"""
+懒加载的语音识别（Whisper）模型
+
+import whisper（连带 torch）和 load_model 都很慢，放在模块顶层会拖住整个应用的启动。
+这里改成：启动时在后台线程加载，或者第一次转写时再加载，并对外暴露加载状态。
+
+StreamingTranscriber 则在用户说话的同时消费麦克风分片：用能量 VAD 丢掉静音，
+每遇到一次短暂停顿就把这一段先转写掉，说完话（停止录音）时只剩最后一小段需要转写。
+"""
+import threading
+import time
+import wave
+from collections import deque
+
+import numpy as np
+
+SAMPLE_RATE = 16000  # Whisper 要求 16kHz 单声道
+
+
+class LazyASR:
+    def __init__(self, model_name: str = "turbo", device: str | None = None, fp16: bool | None = None):
+        """
+        - model_name: Whisper 模型大小（tiny / base / small / medium / large / turbo），CPU 部署建议 base 或 small
+        - device: "cpu" / "cuda"，默认有 GPU 就用 GPU
+        - fp16: 是否用半精度推理，默认只在 GPU 上开启（CPU 不支持 fp16）
+        """
+        self.model_name = model_name
+        self.device = device
+        self.fp16 = fp16
+        self.status = "idle"  # idle / loading / ready / failed
+        self.load_seconds = None
+        self._model = None
+        self._error = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._infer_lock = threading.Lock()  # 多个会话共用一个模型，推理串行执行
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set() and self._model is not None
+
+    def start_loading(self) -> threading.Thread | None:
+        """在后台线程中加载模型，不阻塞应用启动"""
+        with self._lock:
+            if self.status != "idle":
+                return None
+            self.status = "loading"
+        thread = threading.Thread(target=self._load, name="asr-loader", daemon=True)
+        thread.start()
+        return thread
+
+    def wait_ready(self, timeout: float | None = None) -> bool:
+        """等待模型加载完成；如果还没开始加载，或者上次加载失败了，就在当前线程（重新）加载"""
+        with self._lock:
+            if self.status == "failed":
+                # 失败可能是暂时的（比如模型下载中断），清掉失败状态让这次请求重试
+                self.status = "idle"
+                self._error = None
+                self._ready.clear()
+            load_here = self.status == "idle"
+            if load_here:
+                self.status = "loading"
+        if load_here:
+            self._load()
+        self._ready.wait(timeout)
+        error = self._error
+        if error is not None:
+            raise RuntimeError(f"ASR 模型加载失败：{error}") from error
+        return self.ready
+
+    def transcribe(self, audio: "str | np.ndarray") -> str:
+        """audio 可以是音频文件路径，也可以是 16kHz 的 float32 波形"""
+        if not self.wait_ready():
+            raise RuntimeError("ASR 模型加载失败，请稍后重试")
+        with self._infer_lock:
+            result = self._model.transcribe(audio, fp16=self.fp16)
+        return result["text"]
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            import whisper
+            import torch
+
+            if self.device is None:
+                self.device = "cuda" if torch.cuda.is_available() else "cpu"
+            if self.fp16 is None:
+                self.fp16 = self.device == "cuda"
+            self._model = whisper.load_model(self.model_name, device=self.device)
+            self.status = "ready"
+        except Exception as e:
+            self._error = e
+            self.status = "failed"
+        finally:
+            self.load_seconds = time.perf_counter() - start
+            self._ready.set()
+            print(f"[ASR] {self.model_name} on {self.device}: {self.status} in {self.load_seconds:.1f}s")
+
+
+def to_whisper_audio(sample_rate: int, samples: np.ndarray) -> np.ndarray:
+    """把麦克风分片（通常是 48kHz int16，可能是双声道）转成 16kHz 单声道 float32"""
+    audio = np.asarray(samples)
+    if audio.ndim == 2:
+        audio = audio.mean(axis=1)
+    if np.issubdtype(audio.dtype, np.integer):
+        audio = audio.astype(np.float32) / np.iinfo(audio.dtype).max
+    audio = audio.astype(np.float32, copy=False)
+    if sample_rate != SAMPLE_RATE and len(audio):
+        target_len = int(len(audio) * SAMPLE_RATE / sample_rate)
+        audio = np.interp(
+            np.linspace(0, len(audio) - 1, target_len), np.arange(len(audio)), audio
+        ).astype(np.float32)
+    return audio
+
+
+def audio_duration(path: str) -> float | None:
+    """读取 wav 文件头得到录音时长，其他格式返回 None"""
+    try:
+        with wave.open(path, "rb") as f:
+            return f.getnframes() / f.getframerate()
+    except (OSError, EOFError, wave.Error):
+        return None
+
+
+class StreamingTranscriber:
+    """
+    一次语音输入对应一个实例：
+    - feed() 接收麦克风分片，遇到 pause_ms 的停顿就把当前这段话转写并确认下来
+    - 一段话说得很长时，每积累 partial_every 秒就把已经说完的部分（切在最安静的一帧上）先转写掉，
+      每段音频只解码一次，不会反复转写整个越来越长的片段
+    - finalize() 只需转写最后一段还没确认的音频；之后再到达的分片直接忽略
+    feed() 和 finalize() 可能在不同的工作线程里调用，用一把锁串行执行
+    """
+
+    def __init__(self, asr: LazyASR, vad_threshold: float = 0.01, frame_ms: int = 30,
+                 pause_ms: int = 300, preroll_ms: int = 200,
+                 min_speech_ms: int = 250, partial_every: float | None = 2.0):
+        self.asr = asr
+        self.vad_threshold = vad_threshold
+        self.frame_len = SAMPLE_RATE * frame_ms // 1000
+        self.pause_frames = pause_ms // frame_ms
+        self.min_speech_frames = min_speech_ms // frame_ms
+        # 每积累 partial_every 秒新语音就先转写一部分，None 表示一直等到停顿再转写
+        self.partial_every = partial_every
+
+        self.committed: list[str] = []
+        self.partial = ""
+        self.finalized = False
+        self.audio_seconds = 0.0    # 收到的录音总时长
+        self.speech_seconds = 0.0
+        self.dropped_seconds = 0.0  # 被 VAD 丢掉的静音时长
+
+        self._lock = threading.Lock()
+        self._remainder = np.zeros(0, dtype=np.float32)
+        self._preroll: deque[np.ndarray] = deque(maxlen=max(1, preroll_ms // frame_ms))
+        self._segment: list[np.ndarray] = []  # 当前这段话里还没有转写的帧
+        self._pieces: list[str] = []          # 当前这段话里已经提前转写好的部分
+        self._segment_voiced = 0              # 当前这段话的有声帧总数（包括已经提前转写的部分）
+        self._silence_frames = 0
+        self._in_speech = False
+
+    @property
+    def text(self) -> str:
+        return " ".join(t for t in [*self.committed, self.partial] if t).strip()
+
+    def feed(self, sample_rate: int, samples: np.ndarray) -> str:
+        with self._lock:
+            if self.finalized:
+                # 停止录音之后才到达的分片
+                return self.text
+            self._feed(to_whisper_audio(sample_rate, samples))
+            return self.text
+
+    def finalize(self) -> str:
+        """录音结束：转写最后一段尚未确认的语音，返回完整文本"""
+        with self._lock:
+            if not self.finalized:
+                if self._in_speech:
+                    if len(self._remainder):
+                        self._segment.append(self._remainder)
+                    self._commit()
+                self._remainder = np.zeros(0, dtype=np.float32)
+                self.finalized = True
+            return self.text
+
+    def _feed(self, chunk: np.ndarray):
+        self.audio_seconds += len(chunk) / SAMPLE_RATE
+        audio = np.concatenate([self._remainder, chunk])
+        n_frames = len(audio) // self.frame_len
+        self._remainder = audio[n_frames * self.frame_len:]
+
+        for frame in audio[:n_frames * self.frame_len].reshape(n_frames, self.frame_len):
+            voiced = _rms(frame) >= self.vad_threshold
+            if voiced:
+                if not self._in_speech:
+                    self._in_speech = True
+                    self._segment.extend(self._preroll)
+                    self._preroll.clear()
+                self._segment.append(frame)
+                self._segment_voiced += 1
+                self._silence_frames = 0
+            elif self._in_speech:
+                self._segment.append(frame)
+                self._silence_frames += 1
+                if self._silence_frames >= self.pause_frames:
+                    self._commit()
+            else:
+                if len(self._preroll) == self._preroll.maxlen:
+                    self.dropped_seconds += self.frame_len / SAMPLE_RATE
+                self._preroll.append(frame)
+
+        if (self._in_speech and self.partial_every
+                and len(self._segment) >= self.partial_every * SAMPLE_RATE / self.frame_len):
+            self._transcribe_head()
+
+    def _transcribe_head(self):
+        """长句子还没停顿：转写到后半段里最安静的一帧为止，剩下的留到下一次"""
+        speech_end = len(self._segment) - self._silence_frames
+        if speech_end < 2:
+            return
+        half = speech_end // 2
+        cut = half + int(np.argmin([_rms(f) for f in self._segment[half:speech_end]])) + 1
+        audio = np.concatenate(self._segment[:cut])
+        self.speech_seconds += len(audio) / SAMPLE_RATE
+        text = self.asr.transcribe(audio).strip()
+        if text:
+            self._pieces.append(text)
+        self._segment = self._segment[cut:]
+        self.partial = " ".join(self._pieces)
+
+    def _commit(self):
+        # 去掉段尾的静音再转写；整段话太短多半是噪声，直接丢弃，避免 Whisper 幻听
+        speech = self._segment[:len(self._segment) - self._silence_frames]
+        if self._segment_voiced >= self.min_speech_frames:
+            if speech and any(_rms(f) >= self.vad_threshold for f in speech):
+                audio = np.concatenate(speech)
+                self.speech_seconds += len(audio) / SAMPLE_RATE
+                text = self.asr.transcribe(audio).strip()
+                if text:
+                    self._pieces.append(text)
+            if self._pieces:
+                self.committed.append(" ".join(self._pieces))
+        self.partial = ""
+        self._pieces = []
+        self._segment = []
+        self._segment_voiced = 0
+        self._silence_frames = 0
+        self._in_speech = False
+
+
+def _rms(frame: np.ndarray) -> float:
+    return float(np.sqrt(np.mean(frame * frame)))
@@ -0,0 +1,77 @@
+"""
+语音识别启动耗时与首次转写延迟对比：导入时同步加载 vs 后台懒加载
+
+用法：
+    python bench_asr.py sample.wav --model base --device cpu
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from asr import LazyASR
+
+
+def bench_eager(audio_path: str, model_name: str, device: str | None):
+    """旧方式：启动时同步 import whisper 并加载模型，加载完才能开始服务"""
+    start = time.perf_counter()
+    asr = LazyASR(model_name, device=device)
+    asr.wait_ready()
+    startup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    asr.transcribe(audio_path)
+    first = time.perf_counter() - start
+    return startup, first
+
+
+def bench_lazy(audio_path: str, model_name: str, device: str | None, user_delay: float):
+    """新方式：启动时只开后台线程，用户 user_delay 秒后才发来第一段语音"""
+    start = time.perf_counter()
+    asr = LazyASR(model_name, device=device)
+    asr.start_loading()
+    startup = time.perf_counter() - start
+
+    time.sleep(user_delay)
+    start = time.perf_counter()
+    asr.transcribe(audio_path)
+    first = time.perf_counter() - start
+    return startup, first
+
+
+def run_isolated(mode: str, args) -> tuple[float, float]:
+    """每种方式在单独的子进程里跑，否则先跑的一方已经导入了 whisper / torch，后跑的一方数字会偏小"""
+    cmd = [sys.executable, __file__, args.audio, "--model", args.model, "--user-delay", str(args.user_delay),
+           "--mode", mode]
+    if args.device:
+        cmd += ["--device", args.device]
+    output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    return tuple(json.loads(output.splitlines()[-1]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Whisper startup / first transcription benchmark")
+    parser.add_argument("audio", help="用于测试的音频文件")
+    parser.add_argument("--model", default="turbo")
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--user-delay", type=float, default=0.0,
+                        help="模拟启动后多久才有第一个语音请求（秒）")
+    parser.add_argument("--mode", choices=["eager", "lazy"], help="只在当前进程里跑一种方式（供子进程使用）")
+    args = parser.parse_args()
+
+    if args.mode:
+        if args.mode == "eager":
+            result = bench_eager(args.audio, args.model, args.device)
+        else:
+            result = bench_lazy(args.audio, args.model, args.device, args.user_delay)
+        print(json.dumps(result))
+        sys.exit()
+
+    # 注意：第二次加载会命中操作系统的文件缓存，建议多运行几次对比
+    eager = run_isolated("eager", args)
+    lazy = run_isolated("lazy", args)
+
+    print(f"{'mode':<8}{'startup':>12}{'first transcription':>24}")
+    print(f"{'eager':<8}{eager[0]:>11.2f}s{eager[1]:>23.2f}s")
+    print(f"{'lazy':<8}{lazy[0]:>11.2f}s{lazy[1]:>23.2f}s")
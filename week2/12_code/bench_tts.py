@@ -0,0 +1,67 @@
+"""
+首段音频延迟（time-to-first-audio）对比：整段回复生成完再合成 vs 按句子流水线合成
+
+默认使用本地 StubTTSBackend，不需要联网；加 --edge 使用真实的 edge-tts。
+用法：
+    python bench_tts.py --tokens-per-second 30
+"""
+import argparse
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tts import EdgeTTSBackend, SpeechPipeline, StubTTSBackend, TTSCache
+
+REPLY = (
+    "Great try! The correct sentence is: I went to school yesterday. "
+    "We use went because go is an irregular verb, and its past tense is went. "
+    "For example, she went to the park last weekend. "
+    "They went home early because it was raining. "
+    "Can you tell me what you did yesterday, using the past tense?"
+)
+
+
+def fake_llm_stream(text: str, tokens_per_second: float):
+    """按固定速度逐词吐出文本，模拟 LLM 流式输出"""
+    for word in text.split(" "):
+        time.sleep(1 / tokens_per_second)
+        yield word + " "
+
+
+def bench_sequential(backend, tokens_per_second: float) -> float:
+    start = time.perf_counter()
+    full_response = "".join(fake_llm_stream(REPLY, tokens_per_second))
+    backend.synthesize(full_response)
+    return time.perf_counter() - start
+
+
+def bench_pipelined(backend, tokens_per_second: float, cache: TTSCache) -> tuple[float, float]:
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        speech = SpeechPipeline(backend, executor, cache)
+        for delta in fake_llm_stream(REPLY, tokens_per_second):
+            speech.feed(delta)
+            for _ in speech.ready():
+                pass
+        for _ in speech.finish():
+            pass
+        return speech.time_to_first_audio, time.perf_counter() - speech.started_at
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TTS time-to-first-audio benchmark")
+    parser.add_argument("--tokens-per-second", type=float, default=30)
+    parser.add_argument("--edge", action="store_true", help="使用真实的 edge-tts 后端")
+    args = parser.parse_args()
+
+    backend = EdgeTTSBackend() if args.edge else StubTTSBackend()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = TTSCache(cache_dir)
+        sequential = bench_sequential(backend, args.tokens_per_second)
+        first_audio, total = bench_pipelined(backend, args.tokens_per_second, cache)
+        # 同样的回复再来一次，所有句子都应命中缓存
+        cached_first_audio, cached_total = bench_pipelined(backend, args.tokens_per_second, cache)
+
+    print(f"sequential  time_to_first_audio={sequential:.2f}s")
+    print(f"pipelined   time_to_first_audio={first_audio:.2f}s  all_audio_ready={total:.2f}s")
+    print(f"cached      time_to_first_audio={cached_first_audio:.2f}s  all_audio_ready={cached_total:.2f}s")
+    print(f"cache       {cache.stats()}")
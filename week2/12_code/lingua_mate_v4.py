@@ -2,28 +2,54 @@ import gradio as gr
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_openai.chat_models import ChatOpenAI
 from langchain_core.output_parsers import StrOutputParser
-from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
+import asyncio
+import logging
 import os
 import time
-import whisper
-import edge_tts
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from session_store import SessionStore
+from asr import LazyASR, StreamingTranscriber, audio_duration
+from tts import EdgeTTSBackend, SpeechPipeline, StubTTSBackend, TTSCache
+from streaming import StreamStats, acoalesce, coalesce
+from metrics import TurnTrace, VoiceMetrics, start_metrics_server
 
 load_dotenv()
 
 assert os.getenv("OPENAI_API_KEY"), "请先配置 OPENAI_API_KEY"
 
-asr_model = whisper.load_model("turbo")
+# 每轮回复的推送统计只在调试时输出，默认不刷屏
+logger = logging.getLogger(__name__)
+
+# 语音识别模型在后台加载，不阻塞启动；CPU 部署可以通过环境变量换成更小的模型
+asr = LazyASR(
+    model_name=os.getenv("WHISPER_MODEL", "turbo"),
+    device=os.getenv("WHISPER_DEVICE") or None,
+    # 计算精度：WHISPER_FP16=1 强制半精度，=0 强制单精度，不设置则 GPU 用半精度、CPU 用单精度
+    fp16={"1": True, "0": False}.get(os.getenv("WHISPER_FP16", "")),
+)
+# 流式识别：边录音边转写（默认开启），设置 STREAMING_ASR=0 则录完整段后再识别
+STREAMING_ASR = os.getenv("STREAMING_ASR", "1") == "1"
+
+
+# 语音合成：TTS_BACKEND=stub 时使用本地假后端，便于离线测试和压测
+tts_backend = StubTTSBackend() if os.getenv("TTS_BACKEND") == "stub" else EdgeTTSBackend("en-GB-SoniaNeural")
+tts_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tts")
+# 合成过的句子按内容缓存在磁盘上，总大小上限默认 512MB
+tts_cache = TTSCache("tts_cache", max_bytes=int(os.getenv("TTS_CACHE_MB", "512")) * 1024 * 1024)
+
+# 每轮语音对话的分阶段耗时（录音时长、识别、LLM 首 token / 总耗时、合成、首段语音），
+# 启动后可在 http://<host>:METRICS_PORT/metrics 查看；METRICS_PORT=0 关闭
+voice_metrics = VoiceMetrics()
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
 
 
-# 存储不同用户的记忆
-store = {}
+# 存储不同用户的记忆：内存里只保留最近活跃的会话，全部历史落盘到 SQLite，重启后可恢复
+store = SessionStore("sessions.db", max_sessions=1000, ttl_seconds=1800)
 
 def get_session_history(session_id: str):
-    if session_id not in store:
-        store[session_id] = ChatMessageHistory()
-    return store[session_id]
+    return store.get(session_id)
 
 
 english_tutor_prompt = ChatPromptTemplate.from_messages([
@@ -44,7 +70,8 @@ english_tutor_prompt = ChatPromptTemplate.from_messages([
     ("user", "{user_message}"),
 ])
 
-model = ChatOpenAI(model="qwen-flash", base_url="https://dashscope.aliyuncs.com/compatible-mode/v1")
+BASE_URL = os.getenv("OPENAI_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
+model = ChatOpenAI(model="qwen-flash", base_url=BASE_URL)
 output_parser = StrOutputParser()
 
 # 使用 LCEL 表达式将 prompt、model、parser 串联起来
@@ -62,21 +89,23 @@ def speech_to_text(audio_path: str) -> str:
     """
     把用户语音转成文本
     """
-    transcribed = asr_model.transcribe(audio_path)
-    return transcribed["text"]
+    if not asr.ready:
+        gr.Info("语音识别模型加载中，请稍候…")
+    return asr.transcribe(audio_path)
 
-def text_to_speech(text: str) -> str:
+
+def stream_ai_deltas(user_message: str, session_id: str, stats: StreamStats | None = None):
     """
-    输入文本 → 输出音频文件路径
+    调用大模型，只产出增量帧（多个 token 合并成一帧）
+    - user_message: 当前用户输入
+    - session_id: 会话ID（用于区分不同用户）
+    - stats: 可选，用于统计本次回复推送的帧数与字节数
     """
-    print(f"[TTS] Processing: {text}")
-    audio_path = f"./output_{int(time.time())}.mp3"
-    communicate = edge_tts.Communicate(text, "en-GB-SoniaNeural")
-    with open(audio_path, "wb") as file:
-        for chunk in communicate.stream_sync():
-            if chunk["type"] == "audio":
-                file.write(chunk["data"])
-    return audio_path
+    chunks = chain_with_history.stream(
+        {"user_message": user_message},
+        config={"configurable": {"session_id": session_id}}
+    )
+    yield from coalesce((("", chunk) for chunk in chunks if chunk), stats=stats)
 
 
 def stream_ai_response(user_message: str, session_id: str):
@@ -87,43 +116,202 @@ def stream_ai_response(user_message: str, session_id: str):
     """
    
     partial_answer = ""
+    stats = StreamStats()
 
-    for chunk in chain_with_history.stream(
-        {"user_message": user_message},
-        config={"configurable": {"session_id": session_id}}
-    ):
-        if chunk:
-            partial_answer += chunk
-            yield partial_answer
+    # Gradio 的 ChatInterface 需要完整文本，这里按帧（而不是按 token）推送
+    for frame in stream_ai_deltas(user_message, session_id, stats):
+        partial_answer += frame.answer
+        yield partial_answer
+
+    logger.debug("[stream] %s", stats.summary())
+
+async def astream_ai_response(user_message: str, session_id: str):
+    """
+    stream_ai_response 的异步版本：基于 astream，等待模型输出时不占用线程
+    """
+    # 会话不在内存里时 store.get 要同步读 SQLite，先在线程里把历史加载进内存，
+    # 之后 chain_with_history 在事件循环上取历史时一定命中内存
+    await asyncio.to_thread(get_session_history, session_id)
+    partial_answer = ""
+    stats = StreamStats()
 
-def process_voice_and_stream(audio_path: str, history: list):
+    async def deltas():
+        async for chunk in chain_with_history.astream(
+            {"user_message": user_message},
+            config={"configurable": {"session_id": session_id}}
+        ):
+            if chunk:
+                yield "", chunk
+
+    async for frame in acoalesce(deltas(), stats=stats):
+        partial_answer += frame.answer
+        yield partial_answer
+
+    logger.debug("[stream] %s", stats.summary())
+
+def get_session_id(request: gr.Request) -> str:
     """
-    Gradio ChatInterface 的回调函数
+    登录用户用用户名作为会话ID（重启后还能找回历史），
+    否则每个浏览器连接一个独立会话
+    """
+    return request.username or request.session_hash
+
+
+def reply_and_speak(user_text: str, history: list, request: gr.Request, trace: TurnTrace | None = None):
+    """
+    把识别出的文本交给 LLM：流式展示回复，同时按句子流式合成语音
+    - trace: 本轮的分阶段耗时，语音入口会先填好录音时长和识别耗时；纯文本调用时新建一个
+    """
+    trace = trace or TurnTrace()
+    if not user_text:
+        voice_metrics.record(trace)
+        yield history, None
+        return
+    
+    history.append({"role": "user", "content": user_text})
+    history.append({"role": "assistant", "content": ""})
+    yield history, None
+
+    session_id = get_session_id(request)
+
+    # 边生成边合成：每凑满一句就交给 TTS 线程池，合成好的句子按顺序推给播放器
+    speech = SpeechPipeline(tts_backend, tts_executor, tts_cache)
+
+    # 只有读写对话历史的 LLM 阶段需要按会话串行，语音识别和合成可以并行
+    full_response = ""
+    with store.lock(session_id):
+        llm_start = time.perf_counter()
+        for partial in stream_ai_response(user_text, session_id):
+            if trace.llm_ttft_seconds is None:
+                trace.llm_ttft_seconds = time.perf_counter() - llm_start
+            speech.feed(partial[len(full_response):])
+            full_response = partial
+            history[-1]["content"] = full_response
+            # 实时逐块推送文本到 Chatbot
+            yield history, None
+            for audio_segment in speech.ready():
+                yield history, audio_segment
+        trace.llm_seconds = time.perf_counter() - llm_start
+
+    for audio_segment in speech.finish():
+        yield history, audio_segment
+    finish_trace(trace, speech)
+    print(f"[TTS] sentences={speech.sentences} failed={speech.failed} time_to_first_audio={speech.time_to_first_audio} "
+          f"cache={tts_cache.stats()}")
+
+
+def finish_trace(trace: TurnTrace, speech: SpeechPipeline):
+    """本轮结束：补上语音合成相关的耗时，写入直方图"""
+    trace.tts_seconds = speech.synth_seconds
+    if speech.first_audio_at is not None:
+        trace.first_audio_seconds = speech.first_audio_at - trace.started_at
+    voice_metrics.record(trace)
+
+
+def process_voice_and_stream(audio_path: str, history: list, request: gr.Request):
+    """
+    Gradio ChatInterface 的回调函数（整段录音模式）
     负责：
     1. 接收用户输入
     2. 调用 LLM 生成回复
     3. 返回给前端展示
     """
+    trace = TurnTrace(audio_seconds=audio_duration(audio_path))
     user_text = speech_to_text(audio_path)
+    trace.asr_seconds = time.perf_counter() - trace.started_at
+    yield from reply_and_speak(user_text, history, request, trace)
+
+
+def feed_audio_chunk(chunk, transcriber: StreamingTranscriber | None):
+    """
+    流式识别模式：录音过程中每收到一段麦克风音频就调用一次，边说边转写
+    """
+    if transcriber is None:
+        transcriber = StreamingTranscriber(asr)
+    if transcriber.finalized:
+        # 停止录音后才到达的最后一个分片：这一轮已经在回复了，丢弃它并重置状态，下一次录音重新开始
+        return transcriber.text, None
+    if chunk is None:
+        return transcriber.text, transcriber
+    sample_rate, samples = chunk
+    # feed 和 stop_recording 里的 finalize 可能同时在不同线程执行，由 transcriber 内部的锁串行化
+    return transcriber.feed(sample_rate, samples), transcriber
+
+
+def finish_stream_and_reply(transcriber: StreamingTranscriber | None, history: list, request: gr.Request):
+    """
+    流式识别模式：停止录音时只剩最后一小段需要转写，随后立即调用 LLM
+    """
+    trace = TurnTrace(audio_seconds=transcriber.audio_seconds if transcriber else None)
+    user_text = transcriber.finalize() if transcriber else ""
+    trace.asr_seconds = time.perf_counter() - trace.started_at
+    # 最后把 transcriber 重置为 None，下一次录音重新开始
+    for chat, audio_reply in reply_and_speak(user_text, history, request, trace):
+        yield chat, audio_reply, None
+
+
+async def areply_and_speak(user_text: str, history: list, request: gr.Request, trace: TurnTrace | None = None):
+    """
+    reply_and_speak 的异步版本：LLM 流式输出和等待 TTS 结果都不占用线程
+    """
+    trace = trace or TurnTrace()
     if not user_text:
+        voice_metrics.record(trace)
         yield history, None
         return
-    
+
     history.append({"role": "user", "content": user_text})
     history.append({"role": "assistant", "content": ""})
     yield history, None
 
-    session_id = "user_001"  # 在实际应用中，应根据用户身份动态生成
+    session_id = get_session_id(request)
+    speech = SpeechPipeline(tts_backend, tts_executor, tts_cache)
 
     full_response = ""
-    for partial in stream_ai_response(user_text, session_id):
-        full_response = partial
-        history[-1]["content"] = full_response
-        # 实时逐块推送文本到 Chatbot
-        yield history, None
+    async with store.alock(session_id):
+        llm_start = time.perf_counter()
+        async for partial in astream_ai_response(user_text, session_id):
+            if trace.llm_ttft_seconds is None:
+                trace.llm_ttft_seconds = time.perf_counter() - llm_start
+            speech.feed(partial[len(full_response):])
+            full_response = partial
+            history[-1]["content"] = full_response
+            yield history, None
+            for audio_segment in speech.ready():
+                yield history, audio_segment
+        trace.llm_seconds = time.perf_counter() - llm_start
+
+    async for audio_segment in speech.afinish():
+        yield history, audio_segment
+    finish_trace(trace, speech)
+    print(f"[TTS] sentences={speech.sentences} failed={speech.failed} time_to_first_audio={speech.time_to_first_audio} "
+          f"cache={tts_cache.stats()}")
+
+
+async def aprocess_voice_and_stream(audio_path: str, history: list, request: gr.Request):
+    """
+    process_voice_and_stream 的异步版本：Whisper 推理是 CPU/GPU 密集型，放到线程里执行
+    """
+    trace = TurnTrace(audio_seconds=audio_duration(audio_path))
+    user_text = await asyncio.to_thread(speech_to_text, audio_path)
+    trace.asr_seconds = time.perf_counter() - trace.started_at
+    async for item in areply_and_speak(user_text, history, request, trace):
+        yield item
 
-    audio_reply = text_to_speech(full_response)
-    yield history, audio_reply
+
+async def afinish_stream_and_reply(transcriber: StreamingTranscriber | None, history: list, request: gr.Request):
+    """
+    finish_stream_and_reply 的异步版本
+    """
+    trace = TurnTrace(audio_seconds=transcriber.audio_seconds if transcriber else None)
+    user_text = await asyncio.to_thread(transcriber.finalize) if transcriber else ""
+    trace.asr_seconds = time.perf_counter() - trace.started_at
+    async for chat, audio_reply in areply_and_speak(user_text, history, request, trace):
+        yield chat, audio_reply, None
+
+
+# 默认使用异步 handler，设置 ASYNC_HANDLERS=0 回到基于线程池的同步 handler
+ASYNC_HANDLERS = os.getenv("ASYNC_HANDLERS", "1") == "1"
 
 with gr.Blocks(theme=gr.themes.Soft()) as chat_ui:
     gr.Markdown("# 🎙️ 流式多模态英语助手")
@@ -132,10 +320,12 @@ with gr.Blocks(theme=gr.themes.Soft()) as chat_ui:
         with gr.Column(scale=1):
             audio_input = gr.Audio(
                 sources=["microphone"],
-                type="filepath",
+                type="numpy" if STREAMING_ASR else "filepath",
+                streaming=STREAMING_ASR,
                 label="请开口说英语 (Speak English)"
             )
-            audio_output = gr.Audio(label="AI 语音回复", autoplay=True)
+            live_text = gr.Textbox(label="实时识别", interactive=False, visible=STREAMING_ASR)
+            audio_output = gr.Audio(label="AI 语音回复", autoplay=True, streaming=True)
             
         with gr.Column(scale=2):
             # 使用 type="messages" 适配最新的 LangChain/Gradio 格式
@@ -143,15 +333,42 @@ with gr.Blocks(theme=gr.themes.Soft()) as chat_ui:
             clear_btn = gr.Button("清空对话")
 
     # 交互绑定
-    # 当音频改变时触发
-    audio_input.stop_recording(
-        fn=process_voice_and_stream,
-        inputs=[audio_input, chatbot],
-        outputs=[chatbot, audio_output]
-    )
+    if STREAMING_ASR:
+        asr_state = gr.State(None)
+        # 录音过程中每 0.5 秒推送一段音频，边说边识别
+        audio_input.stream(
+            fn=feed_audio_chunk,
+            inputs=[audio_input, asr_state],
+            outputs=[live_text, asr_state],
+            stream_every=0.5,
+        )
+        audio_input.stop_recording(
+            fn=afinish_stream_and_reply if ASYNC_HANDLERS else finish_stream_and_reply,
+            inputs=[asr_state, chatbot],
+            outputs=[chatbot, audio_output, asr_state]
+        )
+    else:
+        # 当录音结束时触发，整段音频一次性识别
+        audio_input.stop_recording(
+            fn=aprocess_voice_and_stream if ASYNC_HANDLERS else process_voice_and_stream,
+            inputs=[audio_input, chatbot],
+            outputs=[chatbot, audio_output]
+        )
     
     clear_btn.click(lambda: [], None, chatbot)
 
 
+# 并发配置：不同用户的请求并行处理；排队请求超过 MAX_QUEUE_SIZE 时直接拒绝新请求（背压）
+# 异步 handler 不占线程，可以把并发上限放得更高
+CONCURRENCY_LIMIT = int(os.getenv("CONCURRENCY_LIMIT", "256" if ASYNC_HANDLERS else "16"))
+MAX_QUEUE_SIZE = int(os.getenv("MAX_QUEUE_SIZE", "64"))
+
+
 if __name__ == "__main__":
-    chat_ui.launch(share=True)  # share=True 会生成公网访问链接
\ No newline at end of file
+    asr.start_loading()
+    if METRICS_PORT:
+        start_metrics_server(voice_metrics, METRICS_PORT)
+    chat_ui.queue(default_concurrency_limit=CONCURRENCY_LIMIT, max_size=MAX_QUEUE_SIZE)
+    # 只有同步 handler 需要按并发数准备线程
+    max_threads = 40 if ASYNC_HANDLERS else max(40, CONCURRENCY_LIMIT)
+    chat_ui.launch(share=True, max_threads=max_threads)  # share=True 会生成公网访问链接
\ No newline at end of file
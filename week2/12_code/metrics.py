@@ -0,0 +1,109 @@
+"""
+语音链路的分阶段耗时统计
+
+一轮语音对话要经过：录音 → 语音识别 → LLM 流式生成 → 按句合成语音。
+用户抱怨"慢"的时候，需要知道到底是哪一段慢。这里对每一轮记录各阶段耗时，
+汇总成直方图，并以 Prometheus 文本格式通过 /metrics 暴露出去。
+
+热路径上只有几次 time.perf_counter()，一轮结束时才统一写入直方图（一次二分查找 + 加锁累加）。
+"""
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 秒级延迟的默认分桶，覆盖从几十毫秒到半分钟
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # 最后一个是 +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+            self._count += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            counts, total, count = list(self._counts), self._sum, self._count
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, n in zip([*self.buckets, "+Inf"], counts):
+            cumulative += n
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {total}")
+        lines.append(f"{self.name}_count {count}")
+        return lines
+
+
+@dataclass
+class TurnTrace:
+    """
+    一轮对话的各阶段耗时（秒），没有经过的阶段保持 None
+    所有时间点都基于 time.perf_counter()，从 started_at（录音结束、开始处理）算起
+    """
+    started_at: float = field(default_factory=time.perf_counter)
+    audio_seconds: float | None = None      # 用户这段录音的时长
+    asr_seconds: float | None = None        # 录音结束后等待识别结果的时间
+    llm_ttft_seconds: float | None = None   # LLM 首个 token 的延迟
+    llm_seconds: float | None = None        # LLM 生成完整回复的时间
+    tts_seconds: float | None = None        # 本轮所有句子的合成耗时之和
+    first_audio_seconds: float | None = None  # 从录音结束到第一段语音可播放
+
+
+class VoiceMetrics:
+    def __init__(self, namespace: str = "lingua_mate"):
+        self.histograms = {
+            "audio_seconds": Histogram(f"{namespace}_audio_seconds", "Length of the recorded user audio",
+                                       (1.0, 2.0, 3.0, 5.0, 10.0, 20.0, 30.0, 60.0)),
+            "asr_seconds": Histogram(f"{namespace}_asr_seconds", "Wait for the transcript after recording stops"),
+            "llm_ttft_seconds": Histogram(f"{namespace}_llm_ttft_seconds", "LLM time to first token"),
+            "llm_seconds": Histogram(f"{namespace}_llm_seconds", "LLM time to the complete reply"),
+            "tts_seconds": Histogram(f"{namespace}_tts_seconds", "Total speech synthesis time per turn"),
+            "first_audio_seconds": Histogram(f"{namespace}_first_audio_seconds",
+                                             "Time from end of recording to the first playable audio"),
+        }
+
+    def record(self, trace: TurnTrace):
+        for name, histogram in self.histograms.items():
+            value = getattr(trace, name)
+            if value is not None:
+                histogram.observe(value)
+
+    def render(self) -> str:
+        return "\n".join(line for h in self.histograms.values() for line in h.render()) + "\n"
+
+
+def start_metrics_server(metrics: VoiceMetrics, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """在后台线程启动 /metrics 接口，供 Prometheus 抓取"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,249 @@
+"""
+按句子流水线合成语音
+
+LLM 还在生成时，就把已经完整的句子交给 TTS 并发合成，
+合成好的音频按原句子顺序依次推给播放器，不必等整段回复生成完。
+
+合成结果按 (文本, 音色, 格式) 的哈希缓存在磁盘上，总大小超过上限时按 LRU 淘汰，
+问候语、常见纠错这类重复出现的句子可以直接命中缓存。
+"""
+import asyncio
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+import wave
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, Future
+from pathlib import Path
+from typing import AsyncIterator, Iterator, Protocol
+
+import edge_tts
+
+# 句末标点：英文标点后需要跟空白，中文标点不需要；换行也算一句结束
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+|[。！？]+|\n+")
+
+
+class TTSBackend(Protocol):
+    voice: str   # 音色，参与缓存 key 的计算
+    suffix: str  # 合成结果的文件后缀，例如 ".mp3"
+
+    def synthesize(self, text: str) -> bytes: ...
+
+
+class EdgeTTSBackend:
+    suffix = ".mp3"
+
+    def __init__(self, voice: str = "en-GB-SoniaNeural"):
+        self.voice = voice
+
+    def synthesize(self, text: str) -> bytes:
+        communicate = edge_tts.Communicate(text, self.voice)
+        return b"".join(chunk["data"] for chunk in communicate.stream_sync() if chunk["type"] == "audio")
+
+
+class StubTTSBackend:
+    """
+    本地测试用：不联网，按文本长度模拟合成耗时，返回对应时长的静音 wav
+    """
+    voice = "stub"
+    suffix = ".wav"
+
+    def __init__(self, base_latency: float = 0.3, seconds_per_char: float = 0.01, sample_rate: int = 16000):
+        self.base_latency = base_latency
+        self.seconds_per_char = seconds_per_char
+        self.sample_rate = sample_rate
+
+    def synthesize(self, text: str) -> bytes:
+        time.sleep(self.base_latency + self.seconds_per_char * len(text))
+        # 大约按每秒 15 个字符的语速生成静音
+        frames = int(self.sample_rate * max(0.2, len(text) / 15))
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(b"\0\0" * frames)
+        return buffer.getvalue()
+
+
+def split_sentences(buffer: str, min_chars: int = 20) -> tuple[list[str], str]:
+    """
+    从缓冲区中切出完整的句子，返回 (句子列表, 剩余未完成的文本)
+    太短的句子（如 "Great!"）会和后面的句子合并，减少 TTS 调用次数
+    """
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END.finditer(buffer):
+        sentence = buffer[start:match.end()].strip()
+        if len(sentence) >= min_chars:
+            sentences.append(sentence)
+            start = match.end()
+    return sentences, buffer[start:]
+
+
+class TTSCache:
+    """
+    内容寻址的语音缓存：文件名就是 (音色, 格式, 文本) 的哈希
+    内存里维护一份按最近使用排序的索引，磁盘总占用超过 max_bytes 时删除最久未用的文件
+    """
+
+    def __init__(self, cache_dir: str = "tts_cache", max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.total_bytes = 0
+        self._index: OrderedDict[str, tuple[Path, int]] = OrderedDict()  # key -> (路径, 字节数)
+        self._lock = threading.Lock()
+
+        # 重启后按修改时间重建索引，之前的缓存继续可用
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        files = [f for f in self.cache_dir.iterdir() if f.is_file() and not f.name.endswith(".tmp")]
+        for f in sorted(files, key=lambda f: f.stat().st_mtime):
+            size = f.stat().st_size
+            self._index[f.stem] = (f, size)
+            self.total_bytes += size
+        with self._lock:
+            self._evict()
+
+    @staticmethod
+    def make_key(text: str, voice: str, suffix: str) -> str:
+        normalized = " ".join(text.split())
+        return hashlib.sha256(f"{voice}\0{suffix}\0{normalized}".encode()).hexdigest()
+
+    def get_or_synthesize(self, backend: TTSBackend, text: str) -> str:
+        """命中缓存直接返回文件路径，否则调用 backend 合成并写入缓存"""
+        key = self.make_key(text, backend.voice, backend.suffix)
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is not None and entry[0].exists():
+                self._index.move_to_end(key)
+                self.hits += 1
+                return str(entry[0])
+            self.misses += 1
+
+        data = backend.synthesize(text)
+        path = self.cache_dir / f"{key}{backend.suffix}"
+        # 先写临时文件再原子替换，避免并发读到写了一半的音频
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            old = self._index.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            self._index[key] = (path, len(data))
+            self.total_bytes += len(data)
+            self._evict()
+        return str(path)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._index),
+            "total_bytes": self.total_bytes,
+        }
+
+    def _evict(self):
+        # 至少保留刚写入的那一个文件
+        while self.total_bytes > self.max_bytes and len(self._index) > 1:
+            _, (path, size) = self._index.popitem(last=False)
+            self.total_bytes -= size
+            path.unlink(missing_ok=True)
+
+
+class SpeechPipeline:
+    """
+    一次回复对应一个实例：
+    - feed() 喂入 LLM 新生成的文本，凑满一句就提交到线程池合成
+    - ready() 非阻塞地按顺序取出已经合成好的音频文件
+    - finish() 提交剩余文本，并按顺序等待所有音频；afinish() 是不阻塞事件循环的异步版本
+    """
+
+    def __init__(self, backend: TTSBackend, executor: Executor, cache: TTSCache, min_chars: int = 20):
+        self.backend = backend
+        self.executor = executor
+        self.cache = cache
+        self.min_chars = min_chars
+        self.started_at = time.perf_counter()
+        self.first_audio_at = None  # 第一段音频可播放的时刻
+        self.sentences = 0
+        self.failed = 0  # 合成失败、被跳过的句子数
+        self._synth_times: list[float] = []  # 每句的合成耗时（含缓存命中），由线程池写入
+        self._buffer = ""
+        self._pending: deque[Future] = deque()
+
+    @property
+    def time_to_first_audio(self) -> float | None:
+        if self.first_audio_at is None:
+            return None
+        return self.first_audio_at - self.started_at
+
+    @property
+    def synth_seconds(self) -> float:
+        return sum(self._synth_times)
+
+    def feed(self, delta: str):
+        self._buffer += delta
+        sentences, self._buffer = split_sentences(self._buffer, self.min_chars)
+        for sentence in sentences:
+            self._submit(sentence)
+
+    def ready(self) -> Iterator[str]:
+        # 只能按顺序输出：队首没合成好时，后面的即使好了也要等
+        while self._pending and self._pending[0].done():
+            path = self._take()
+            if path is not None:
+                yield path
+
+    def finish(self) -> Iterator[str]:
+        if self._buffer.strip():
+            self._submit(self._buffer.strip())
+        self._buffer = ""
+        while self._pending:
+            path = self._take()
+            if path is not None:
+                yield path
+
+    async def afinish(self) -> AsyncIterator[str]:
+        if self._buffer.strip():
+            self._submit(self._buffer.strip())
+        self._buffer = ""
+        while self._pending:
+            try:
+                await asyncio.wrap_future(self._pending[0])
+            except Exception:
+                pass  # 只等这一句结束，失败由 _take 处理
+            path = self._take()
+            if path is not None:
+                yield path
+
+    def _submit(self, sentence: str):
+        self.sentences += 1
+        self._pending.append(self.executor.submit(self._synthesize, sentence))
+
+    def _synthesize(self, sentence: str) -> str:
+        start = time.perf_counter()
+        try:
+            return self.cache.get_or_synthesize(self.backend, sentence)
+        finally:
+            self._synth_times.append(time.perf_counter() - start)
+
+    def _take(self) -> str | None:
+        """取出队首一句的音频；合成失败时只跳过这一句（返回 None），文字回复和后面的语音照常输出"""
+        try:
+            path = self._pending.popleft().result()
+        except Exception as e:
+            self.failed += 1
+            print(f"[TTS] sentence skipped: {e!r}")
+            return None
+        if self.first_audio_at is None:
+            self.first_audio_at = time.perf_counter()
+        return path
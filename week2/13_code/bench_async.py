@@ -0,0 +1,122 @@
+"""
+同步 handler（每个回复占一个线程）vs 异步 handler（同一个事件循环）的并发压测
+
+使用本地的慢速假模型代替真实 LLM，不需要联网：
+    python bench_async.py --connections 200 --token-delay 0.02
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+# 资源采样等工具和 benchmarks/load_driver.py 共用
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "benchmarks"))
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+import lingua_mate_v5 as app
+from bench_utils import ResourceMonitor, current_rss, new_request
+from session_store import SessionStore
+
+
+class SlowFakeChatModel(BaseChatModel):
+    """按固定间隔逐词输出的假模型，同时实现同步和异步流式接口"""
+    reply: str = "Good try! The correct sentence is: I went to school yesterday. Went is the past tense of go."
+    token_delay: float = 0.02
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.reply))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for word in self.reply.split(" "):
+            time.sleep(self.token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        for word in self.reply.split(" "):
+            await asyncio.sleep(self.token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+
+
+_session_ids = itertools.count()
+
+
+def next_request():
+    # 每个连接一个全新的独立会话
+    return new_request(f"bench_{next(_session_ids)}")
+
+
+def run_sync(connections: int):
+    def one(i):
+        for _ in app.chat_handler("I goed to school yesterday", [], False, next_request()):
+            pass
+
+    # 和 Gradio 的同步 handler 一样：每个进行中的回复占用一个工作线程
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        list(executor.map(one, range(connections)))
+
+
+def run_async(connections: int):
+    async def one(i):
+        async for _ in app.achat_handler("I goed to school yesterday", [], False, next_request()):
+            pass
+
+    async def main():
+        await asyncio.gather(*(one(i) for i in range(connections)))
+
+    asyncio.run(main())
+
+
+def measure(name: str, runner, connections: int, trace_heap: bool):
+    base_rss = current_rss()
+    # tracemalloc 会明显拖慢执行，只在需要看 Python 堆内存时打开
+    if trace_heap:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with ResourceMonitor() as monitor, contextlib.redirect_stdout(io.StringIO()):
+        runner(connections)
+    elapsed = time.perf_counter() - start
+    line = (f"{name:<6} connections={connections:<5} wall={elapsed:6.2f}s "
+            f"peak_threads={monitor.peak_threads:<5} "
+            f"rss/conn={max(0, monitor.peak_rss - base_rss) / connections / 1024:7.1f}KB")
+    if trace_heap:
+        _, peak_heap = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        line += f" heap/conn={peak_heap / connections / 1024:7.1f}KB"
+    print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="sync vs async lingua_mate handler load test")
+    parser.add_argument("--connections", type=int, default=200)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--trace-heap", action="store_true", help="用 tracemalloc 统计 Python 堆内存峰值")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app.store = SessionStore(os.path.join(tmp, "bench_sessions.db"), max_sessions=args.connections * 2)
+        app.get_model = lambda deep_thinking: SlowFakeChatModel(token_delay=args.token_delay)
+        app._chain_registry.clear()
+
+        # 先跑一轮预热，避免首次导入、建 chain 的开销算到第一种模式头上
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_async(1)
+            run_sync(1)
+
+        measure("sync", run_sync, args.connections, args.trace_heap)
+        measure("async", run_async, args.connections, args.trace_heap)
@@ -0,0 +1,76 @@
+"""
+首 token 延迟（TTFT）对比：每轮重建 chain vs 复用预构建的 chain
+
+用法：
+    python bench_ttft.py --turns 20 --deep-thinking
+
+可通过环境变量 OPENAI_BASE_URL 指向本地的 OpenAI 兼容服务做离线测试。
+"""
+import argparse
+import statistics
+import time
+
+from langchain_core.runnables.history import RunnableWithMessageHistory
+from langchain_openai.chat_models import ChatOpenAI
+
+import lingua_mate_v5 as app
+
+
+def build_baseline_chain(deep_thinking: bool):
+    """
+    改动前的 build_chain：每轮新建一个不带 http_client 的 ChatOpenAI，
+    也就是每轮都是一个新的连接池、重新建连（app.build_chain 已经改用共享连接池，不能拿来当基线）
+    """
+    if deep_thinking:
+        model = ChatOpenAI(model=app.THINKING_MODEL, base_url=app.BASE_URL, extra_body={"enable_thinking": True})
+    else:
+        model = ChatOpenAI(model=app.NORMAL_MODEL, base_url=app.BASE_URL)
+    return RunnableWithMessageHistory(
+        app.english_tutor_prompt | model,
+        app.get_session_history,
+        input_messages_key="user_message",
+        history_messages_key="chat_history",
+    )
+
+
+def measure_ttft(get_chain, deep_thinking: bool, turns: int, session_id: str) -> list[float]:
+    """
+    连续发起 turns 轮对话，返回每轮从发起请求到收到第一个 chunk 的耗时（秒）
+    """
+    ttfts = []
+    for i in range(turns):
+        start = time.perf_counter()
+        chain_with_history = get_chain(deep_thinking)
+        for _ in chain_with_history.stream(
+            {"user_message": f"I goed to school yesterday. ({i})"},
+            config={"configurable": {"session_id": session_id}}
+        ):
+            ttfts.append(time.perf_counter() - start)
+            break
+    return ttfts
+
+
+def report(name: str, ttfts: list[float]):
+    ordered = sorted(ttfts)
+    p50 = statistics.median(ordered)
+    p90 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]
+    print(f"{name:<10} turns={len(ordered):<4} "
+          f"mean={statistics.mean(ordered) * 1000:8.1f}ms "
+          f"p50={p50 * 1000:8.1f}ms p90={p90 * 1000:8.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="lingua_mate_v5 TTFT benchmark")
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--deep-thinking", action="store_true")
+    args = parser.parse_args()
+
+    # 旧方式：每条消息都重新创建 ChatOpenAI 和 RunnableWithMessageHistory
+    before = measure_ttft(build_baseline_chain, args.deep_thinking, args.turns, "bench_rebuild")
+
+    # 新方式：启动时预热，之后每轮复用注册表里的 chain 与连接池
+    app.warm_up_chains()
+    after = measure_ttft(app.get_chain, args.deep_thinking, args.turns, "bench_registry")
+
+    report("rebuild", before)
+    report("registry", after)
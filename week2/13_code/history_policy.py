@@ -0,0 +1,140 @@
+"""
+按 token 预算裁剪对话历史，并把更早的对话增量折叠成摘要
+
+每轮只把「摘要 + 最近 keep_tokens 个 token 的原始对话」发给模型：
+- 每条消息的 token 数只在第一次见到时用 tiktoken 计算一次，之后直接复用
+- 滑出窗口的旧对话积累到 fold_tokens 后，在后台线程里合并进滚动摘要，不阻塞当前这一轮
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import cached_property
+
+import tiktoken
+from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+summary_prompt = ChatPromptTemplate.from_messages([
+    ("system", """You maintain a running summary of an English tutoring session.
+
+        Merge the new conversation lines into the existing summary.
+        Keep the learner's level, recurring mistakes, corrections already given and open topics.
+        Reply with the updated summary only, in at most 150 words.
+    """),
+    ("user", "Existing summary:\n{summary}\n\nNew lines:\n{new_lines}"),
+])
+
+
+@dataclass
+class _SessionState:
+    token_counts: list[int] = field(default_factory=list)  # 与历史消息一一对应的 token 数缓存
+    summary: str = ""
+    summary_tokens: int = 0
+    summarized_upto: int = 0  # history[:summarized_upto] 已经折叠进摘要
+    folding: bool = False     # 后台是否正在更新摘要
+    turns: int = 0
+    full_tokens: int = 0      # 累计：如果发送完整历史需要的 token 数
+    sent_tokens: int = 0      # 累计：实际发送的历史 token 数
+
+
+class TokenBudgetHistory:
+    def __init__(self, summarizer, keep_tokens: int = 1000, fold_tokens: int = 400,
+                 encoding: str = "cl100k_base", max_sessions: int = 1000):
+        self.summary_chain = summary_prompt | summarizer | StrOutputParser()
+        self.keep_tokens = keep_tokens
+        self.fold_tokens = fold_tokens
+        self.encoding_name = encoding
+        self.max_sessions = max_sessions
+        self._sessions: OrderedDict[str, _SessionState] = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-summary")
+
+    @cached_property
+    def encoding(self):
+        # 首次计数时才加载编码表，不拖慢启动
+        return tiktoken.get_encoding(self.encoding_name)
+
+    def count_tokens(self, message: BaseMessage) -> int:
+        # 每条消息额外算 4 个 token 的角色/分隔符开销
+        return len(self.encoding.encode(str(message.content))) + 4
+
+    def select(self, session_id: str, history: list[BaseMessage]) -> list[BaseMessage]:
+        """返回本轮真正要放进 chat_history 的消息"""
+        with self._lock:
+            state = self._get_state(session_id)
+
+            # 历史被清空或替换过，缓存全部作废
+            if len(history) < len(state.token_counts):
+                self._sessions[session_id] = state = _SessionState()
+            for message in history[len(state.token_counts):]:
+                state.token_counts.append(self.count_tokens(message))
+
+            # 从最新的消息往前数，保留 keep_tokens 以内的原始对话，并且从一条用户消息开始
+            cut = len(history)
+            used = 0
+            while cut > 0 and used + state.token_counts[cut - 1] <= self.keep_tokens:
+                cut -= 1
+                used += state.token_counts[cut]
+            while cut < len(history) and history[cut].type != "human":
+                cut += 1
+
+            # 还没折叠进摘要的旧消息先原样带上，等后台摘要完成后再丢弃
+            start = min(state.summarized_upto, cut)
+            pending_tokens = sum(state.token_counts[start:cut])
+            if pending_tokens >= self.fold_tokens and not state.folding:
+                state.folding = True
+                self._executor.submit(self._fold, session_id, state, history[start:cut], cut)
+
+            selected = history[start:]
+            sent = sum(state.token_counts[start:])
+            if state.summary:
+                selected = [SystemMessage(content=f"Summary of the earlier conversation:\n{state.summary}")] + selected
+                sent += state.summary_tokens
+
+            state.turns += 1
+            state.full_tokens += sum(state.token_counts)
+            state.sent_tokens += sent
+        return selected
+
+    def stats(self, session_id: str) -> dict:
+        """某个会话累计节省的 prompt token"""
+        with self._lock:
+            state = self._sessions.get(session_id) or _SessionState()
+            saved = state.full_tokens - state.sent_tokens
+            return {
+                "turns": state.turns,
+                "full_tokens": state.full_tokens,
+                "sent_tokens": state.sent_tokens,
+                "saved_tokens": saved,
+                "saved_ratio": saved / state.full_tokens if state.full_tokens else 0.0,
+                "summary_tokens": state.summary_tokens,
+            }
+
+    def as_runnable_input(self, inputs: dict, config) -> list[BaseMessage]:
+        """给 RunnablePassthrough.assign 用：从 config 中取出 session_id 后裁剪 chat_history"""
+        session_id = config["configurable"]["session_id"]
+        return self.select(session_id, inputs["chat_history"])
+
+    def _get_state(self, session_id: str) -> _SessionState:
+        state = self._sessions.pop(session_id, None) or _SessionState()
+        self._sessions[session_id] = state
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return state
+
+    def _fold(self, session_id: str, state: _SessionState, messages: list[BaseMessage], upto: int):
+        new_lines = "\n".join(f"{m.type}: {m.content}" for m in messages)
+        try:
+            summary = self.summary_chain.invoke({"summary": state.summary or "(empty)", "new_lines": new_lines})
+        except Exception as e:
+            # 摘要失败不影响对话，这些消息下一轮仍会原样发送
+            print(f"[history] summary failed for {session_id}: {e}")
+            summary = None
+        with self._lock:
+            if summary:
+                state.summary = summary.strip()
+                state.summary_tokens = len(self.encoding.encode(state.summary)) + 4
+                state.summarized_upto = upto
+            state.folding = False
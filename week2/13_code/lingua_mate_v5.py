@@ -1,6 +1,5 @@
-
 from typing import Mapping, Any
-from langchain_core.messages import AIMessageChunk, BaseMessageChunk
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessageChunk, HumanMessage
 from langchain_openai.chat_models import base
 from typing import cast
 
@@ -42,24 +41,33 @@ import gradio as gr
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_openai.chat_models import ChatOpenAI
 from langchain_core.output_parsers import StrOutputParser
-from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.runnables import RunnablePassthrough
 from langchain_core.runnables.history import RunnableWithMessageHistory
+import asyncio
+import logging
 import os
+import threading
+import httpx
 from dotenv import load_dotenv
+from session_store import SessionStore
+from history_policy import TokenBudgetHistory
+from semantic_cache import SemanticCache
+from streaming import StreamStats, acoalesce, coalesce
 
 load_dotenv()
 
 assert os.getenv("OPENAI_API_KEY"), "请先配置 OPENAI_API_KEY"
 
+# 每轮回复的推送统计只在调试时输出，默认不刷屏
+logger = logging.getLogger(__name__)
+
 
 
-# 存储不同用户的记忆
-store = {}
+# 存储不同用户的记忆：内存里只保留最近活跃的会话，全部历史落盘到 SQLite，重启后可恢复
+store = SessionStore("sessions.db", max_sessions=1000, ttl_seconds=1800)
 
 def get_session_history(session_id: str):
-    if session_id not in store:
-        store[session_id] = ChatMessageHistory()
-    return store[session_id]
+    return store.get(session_id)
 
 
 english_tutor_prompt = ChatPromptTemplate.from_messages([
@@ -80,19 +88,68 @@ english_tutor_prompt = ChatPromptTemplate.from_messages([
     ("user", "{user_message}"),
 ])
 
+BASE_URL = os.getenv("OPENAI_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
+NORMAL_MODEL = "qwen-max"
+THINKING_MODEL = "qwen-flash"
+SUMMARY_MODEL = "qwen-flash"
+
+# 进程级共享的 HTTP 连接池：所有 ChatOpenAI 复用同一组 keep-alive / TLS 连接，
+# 避免每轮对话都重新建连
+http_client = httpx.Client(
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    timeout=httpx.Timeout(60.0, connect=10.0),
+)
+# 异步 handler（astream）使用的连接池，同样在所有 chain 之间共享
+http_async_client = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=500, max_keepalive_connections=100),
+    timeout=httpx.Timeout(60.0, connect=10.0),
+)
+
+
 def get_model(is_reasoning):
     if is_reasoning:
-        print("Using deep thinking...")
-        return ChatOpenAI(model="qwen-flash", 
-                          base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-                          extra_body={"enable_thinking": True})
+        return ChatOpenAI(model=THINKING_MODEL,
+                          base_url=BASE_URL,
+                          extra_body={"enable_thinking": True},
+                          http_client=http_client,
+                          http_async_client=http_async_client)
     else:
-        return ChatOpenAI(model="qwen-max", base_url="https://dashscope.aliyuncs.com/compatible-mode/v1")
+        return ChatOpenAI(model=NORMAL_MODEL, base_url=BASE_URL,
+                          http_client=http_client, http_async_client=http_async_client)
+
+
+# 历史窗口策略：只发送最近约 1000 token 的原始对话，更早的内容由便宜的模型在后台折叠成摘要
+history_policy = TokenBudgetHistory(
+    ChatOpenAI(model=SUMMARY_MODEL, base_url=BASE_URL, http_client=http_client,
+               http_async_client=http_async_client),
+    keep_tokens=1000,
+    fold_tokens=400,
+)
+
+
+# 可选的语义缓存：SEMANTIC_CACHE=1 时开启，几乎相同的句子直接复用之前的纠错回复
+semantic_cache = SemanticCache(threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))) \
+    if os.getenv("SEMANTIC_CACHE") == "1" else None
+
+
+def cache_mode(deep_thinking: bool, history: list) -> tuple | None:
+    """
+    语义缓存按模式分区：普通模式和深度思考模式的回复不能混用。
+    只有会话的第一轮才使用缓存：之后的回复可能引用这个学习者之前说过的话，
+    既不能给其他学习者看，换了上下文也不一定正确。返回 None 表示这一轮不使用缓存
+    """
+    if semantic_cache is None or history:
+        return None
+    return deep_thinking, THINKING_MODEL if deep_thinking else NORMAL_MODEL
 
 
 def build_chain(deep_thinking: bool):
     model = get_model(deep_thinking)
-    chain = english_tutor_prompt | model 
+    chain = (
+        RunnablePassthrough.assign(chat_history=history_policy.as_runnable_input)
+        | english_tutor_prompt
+        | model
+    )
 
     chain_with_history = RunnableWithMessageHistory(
         chain,
@@ -102,44 +159,182 @@ def build_chain(deep_thinking: bool):
     )
     return chain_with_history
 
+
+# 预构建好的 chain 注册表：key = (是否深度思考, 模型名, base_url)
+# chain 本身是无状态的（会话状态在 get_session_history 里），可以安全地跨轮次、跨用户复用
+_chain_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_chain(deep_thinking: bool):
+    """
+    获取（必要时创建）对应模式的 chain，同一模式在整个进程中只构建一次
+    """
+    key = (deep_thinking, THINKING_MODEL if deep_thinking else NORMAL_MODEL, BASE_URL)
+    chain_with_history = _chain_registry.get(key)
+    if chain_with_history is None:
+        with _registry_lock:
+            chain_with_history = _chain_registry.get(key)
+            if chain_with_history is None:
+                chain_with_history = build_chain(deep_thinking)
+                _chain_registry[key] = chain_with_history
+    return chain_with_history
+
+
+def warm_up_chains():
+    """
+    启动时预热：提前构建两种模式的 chain，并预先建立到模型服务的 TLS 连接，
+    这样第一位用户的首 token 延迟也不用承担这部分开销
+    """
+    for deep_thinking in (False, True):
+        get_chain(deep_thinking)
+    try:
+        http_client.head(BASE_URL)
+    except httpx.HTTPError:
+        # 预热失败不影响启动，第一次真实请求时再建连
+        pass
+
+
+def render_reply(thinking: str, answer: str, done: bool = False) -> str:
+    """
+    拼出前端展示的文本
+    Gradio 推送生成器的输出时只发送和上一帧的差异，新文本以上一帧开头时只需要发送追加的部分。
+    所以思考阶段先不写 </thinking>，保证每一帧都是上一帧的延续，否则每帧都要整段重发思考内容
+    """
+    if not answer and not done:
+        return f"<thinking>{thinking}"
+    return f"<thinking>{thinking}</thinking>\n\n{answer}"
+
+
+def stream_ai_deltas(user_message: str, session_id: str, deep_thinking: bool, stats: StreamStats | None = None):
+    """
+    调用大模型，只产出增量帧（思考、回答两个通道分开）
+    - user_message: 当前用户输入
+    - session_id: 会话ID（用于区分不同用户）
+    - stats: 可选，用于统计本次回复推送的帧数与字节数
+    """
+    if deep_thinking:
+        print("Using deep thinking...")
+    chain_with_history = get_chain(deep_thinking)
+
+    def deltas():
+        for chunk in chain_with_history.stream(
+            {"user_message": user_message},
+            config={"configurable": {"session_id": session_id}}
+        ):
+            if not isinstance(chunk, AIMessageChunk):
+                continue
+            # 深度思考（不进历史）/ 最终回答（进历史）
+            yield chunk.additional_kwargs.get("reasoning_content", ""), chunk.content
+
+    yield from coalesce(deltas(), stats=stats)
+
+
 def stream_ai_response(user_message: str, session_id: str, deep_thinking: bool):
     """
     调用大模型，生成回复内容
     - user_message: 当前用户输入
     - session_id: 会话ID（用于区分不同用户）
     """
-    chain_with_history = build_chain(deep_thinking)
+    mode = cache_mode(deep_thinking, get_session_history(session_id).messages)
+    if mode is not None:
+        cached = semantic_cache.lookup(user_message, mode)
+        if cached is not None:
+            # 命中缓存也要写进对话历史，保证后续多轮对话的上下文完整
+            get_session_history(session_id).add_messages(
+                [HumanMessage(content=user_message), AIMessage(content=cached)]
+            )
+            print(f"[semantic_cache] hit {semantic_cache.stats()}")
+            yield f"<thinking></thinking>\n\n{cached}"
+            return
 
     answer_buffer = ""
     thinking_buffer = ""
+    stats = StreamStats()
+
+    # Gradio 的 ChatInterface 需要完整文本，这里按帧（而不是按 token）重新渲染；
+    # 实际推送给浏览器的只有和上一帧的差异，见 render_reply
+    for frame in stream_ai_deltas(user_message, session_id, deep_thinking, stats):
+        thinking_buffer += frame.reasoning
+        answer_buffer += frame.answer
+
+        # 思考内容只用于前端展示
+        yield render_reply(thinking_buffer, answer_buffer)
+    if not answer_buffer:
+        yield render_reply(thinking_buffer, answer_buffer, done=True)
+
+    logger.debug("[stream] %s", stats.summary())
+    logger.debug("[history] %s", history_policy.stats(session_id))
+    if mode is not None:
+        semantic_cache.add(user_message, mode, answer_buffer)
+
+async def astream_ai_deltas(user_message: str, session_id: str, deep_thinking: bool,
+                            stats: StreamStats | None = None):
+    """
+    stream_ai_deltas 的异步版本：基于 astream，等待模型输出时不占用线程
+    """
+    if deep_thinking:
+        print("Using deep thinking...")
+    chain_with_history = get_chain(deep_thinking)
 
-    for chunk in chain_with_history.stream(
-        {"user_message": user_message},
-        config={"configurable": {"session_id": session_id}}
-    ):
-        if not isinstance(chunk, AIMessageChunk):
-            continue
-
-        # ===== 1. 深度思考（不进历史）=====
-        if "reasoning_content" in chunk.additional_kwargs:
-            thinking_buffer += chunk.additional_kwargs["reasoning_content"]
-
-            # 只用于前端展示
-            yield (
-                f"<thinking>{thinking_buffer}</thinking>\n\n"
-                f"{answer_buffer}"
-            )
+    async def deltas():
+        async for chunk in chain_with_history.astream(
+            {"user_message": user_message},
+            config={"configurable": {"session_id": session_id}}
+        ):
+            if not isinstance(chunk, AIMessageChunk):
+                continue
+            yield chunk.additional_kwargs.get("reasoning_content", ""), chunk.content
+
+    async for frame in acoalesce(deltas(), stats=stats):
+        yield frame
 
-        # ===== 2. 最终回答（进历史）=====
-        if chunk.content:
-            answer_buffer += chunk.content
 
-            yield (
-                f"<thinking>{thinking_buffer}</thinking>\n\n"
-                f"{answer_buffer}"
+async def astream_ai_response(user_message: str, session_id: str, deep_thinking: bool):
+    """
+    stream_ai_response 的异步版本
+    """
+    # 会话不在内存里时 store.get 要同步读 SQLite，先在线程里把历史加载进内存，
+    # 之后 chain_with_history 在事件循环上取历史时一定命中内存
+    history = await asyncio.to_thread(get_session_history, session_id)
+    mode = cache_mode(deep_thinking, history.messages)
+    if mode is not None:
+        # 句子向量化是 CPU 密集型操作，放到线程里执行，不阻塞事件循环
+        cached = await asyncio.to_thread(semantic_cache.lookup, user_message, mode)
+        if cached is not None:
+            await history.aadd_messages(
+                [HumanMessage(content=user_message), AIMessage(content=cached)]
             )
+            print(f"[semantic_cache] hit {semantic_cache.stats()}")
+            yield f"<thinking></thinking>\n\n{cached}"
+            return
 
-def chat_handler(message: str, history: list, deep_thinking: bool):
+    answer_buffer = ""
+    thinking_buffer = ""
+    stats = StreamStats()
+
+    async for frame in astream_ai_deltas(user_message, session_id, deep_thinking, stats):
+        thinking_buffer += frame.reasoning
+        answer_buffer += frame.answer
+        yield render_reply(thinking_buffer, answer_buffer)
+    if not answer_buffer:
+        yield render_reply(thinking_buffer, answer_buffer, done=True)
+
+    logger.debug("[stream] %s", stats.summary())
+    logger.debug("[history] %s", history_policy.stats(session_id))
+    if mode is not None:
+        await asyncio.to_thread(semantic_cache.add, user_message, mode, answer_buffer)
+
+
+def get_session_id(request: gr.Request) -> str:
+    """
+    登录用户用用户名作为会话ID（重启后还能找回历史），
+    否则每个浏览器连接一个独立会话
+    """
+    return request.username or request.session_hash
+
+
+def chat_handler(message: str, history: list, deep_thinking: bool, request: gr.Request):
     """
     Gradio ChatInterface 的回调函数
     负责：
@@ -147,14 +342,30 @@ def chat_handler(message: str, history: list, deep_thinking: bool):
     2. 调用 LLM 生成回复
     3. 返回给前端展示
     """
-    session_id = "user_001"  # 在实际应用中，应根据用户身份动态生成
-    for partial in stream_ai_response(message, session_id, deep_thinking):
-        yield partial
+    session_id = get_session_id(request)
+    # 同一用户的多条消息排队执行，避免并发读写同一份历史
+    with store.lock(session_id):
+        for partial in stream_ai_response(message, session_id, deep_thinking):
+            yield partial
+
+
+async def achat_handler(message: str, history: list, deep_thinking: bool, request: gr.Request):
+    """
+    chat_handler 的异步版本：Gradio 直接在事件循环上运行异步生成器，
+    一个进程可以同时挂着成百上千个流式回复，而不是每个回复占用一个线程
+    """
+    session_id = get_session_id(request)
+    async with store.alock(session_id):
+        async for partial in astream_ai_response(message, session_id, deep_thinking):
+            yield partial
+
 
+# 默认使用异步 handler，设置 ASYNC_HANDLERS=0 回到基于线程池的同步 handler
+ASYNC_HANDLERS = os.getenv("ASYNC_HANDLERS", "1") == "1"
 
 # 使用 Gradio 专门为聊天机器人设计的高层接口
 chat_ui = gr.ChatInterface(
-    fn=chat_handler,
+    fn=achat_handler if ASYNC_HANDLERS else chat_handler,
     additional_inputs=[
         gr.Checkbox(label="深度思考", value=False)
     ],
@@ -163,5 +374,15 @@ chat_ui = gr.ChatInterface(
 )
 
 
+# 并发配置：不同用户的请求并行处理；排队请求超过 MAX_QUEUE_SIZE 时直接拒绝新请求（背压）
+# 异步 handler 不占线程，可以把并发上限放得更高
+CONCURRENCY_LIMIT = int(os.getenv("CONCURRENCY_LIMIT", "256" if ASYNC_HANDLERS else "16"))
+MAX_QUEUE_SIZE = int(os.getenv("MAX_QUEUE_SIZE", "64"))
+
+
 if __name__ == "__main__":
-    chat_ui.launch(share=True)  # share=True 会生成公网访问链接
\ No newline at end of file
+    warm_up_chains()
+    chat_ui.queue(default_concurrency_limit=CONCURRENCY_LIMIT, max_size=MAX_QUEUE_SIZE)
+    # 只有同步 handler 需要按并发数准备线程
+    max_threads = 40 if ASYNC_HANDLERS else max(40, CONCURRENCY_LIMIT)
+    chat_ui.launch(share=True, max_threads=max_threads)  # share=True 会生成公网访问链接
\ No newline at end of file
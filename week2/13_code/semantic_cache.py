@@ -0,0 +1,107 @@
+"""
+语义缓存：学习者经常发来几乎一样的句子（"I goed to school yesterday"），
+与其每次都完整调用一次大模型，不如把用户消息向量化，
+在已缓存的消息里找最相似的一条，相似度超过阈值就直接复用之前的纠错回复。
+缓存在所有会话之间共享，所以只能缓存不依赖对话上下文的回复（调用方只在会话第一轮使用，见 cache_mode）。
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+
+@dataclass
+class _Partition:
+    """同一种模式（普通 / 深度思考 + 模型名）下的缓存条目，向量按行存放在一个矩阵里"""
+    embeddings: np.ndarray
+    messages: list[str] = field(default_factory=list)
+    responses: list[str] = field(default_factory=list)
+    last_used: list[float] = field(default_factory=list)
+
+
+class SemanticCache:
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", threshold: float = 0.95,
+                 max_entries: int = 5000):
+        """
+        - threshold: 余弦相似度阈值。错句和改正后的句子本身就很相似，阈值不宜过低
+        - max_entries: 每种模式最多缓存的条目数，满了以后淘汰最久没命中的
+        """
+        self.model_name = model_name
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lookup_seconds = 0.0
+        self._encoder = None
+        self._partitions: dict[tuple, _Partition] = {}
+        self._lock = threading.Lock()
+        self._encoder_lock = threading.Lock()
+
+    def lookup(self, message: str, mode: tuple) -> str | None:
+        """返回命中的缓存回复，没有命中返回 None"""
+        start = time.perf_counter()
+        query = self._encode(message)
+        response = None
+        with self._lock:
+            partition = self._partitions.get(mode)
+            if partition is not None and partition.messages:
+                n = len(partition.messages)
+                # 向量都已归一化，矩阵乘法一次算出与所有缓存条目的余弦相似度
+                scores = partition.embeddings[:n] @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    partition.last_used[best] = time.monotonic()
+                    response = partition.responses[best]
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            self.lookup_seconds += time.perf_counter() - start
+        return response
+
+    def add(self, message: str, mode: tuple, response: str):
+        if not response:
+            return
+        embedding = self._encode(message)
+        with self._lock:
+            partition = self._partitions.get(mode)
+            if partition is None:
+                partition = _Partition(np.zeros((self.max_entries, embedding.shape[0]), dtype=np.float32))
+                self._partitions[mode] = partition
+
+            if len(partition.messages) < self.max_entries:
+                slot = len(partition.messages)
+                partition.messages.append(message)
+                partition.responses.append(response)
+                partition.last_used.append(time.monotonic())
+            else:
+                # 缓存已满：覆盖最久没有被命中的条目
+                slot = int(np.argmin(partition.last_used))
+                partition.messages[slot] = message
+                partition.responses[slot] = response
+                partition.last_used[slot] = time.monotonic()
+                self.evictions += 1
+            partition.embeddings[slot] = embedding
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "avg_lookup_ms": self.lookup_seconds / lookups * 1000 if lookups else 0.0,
+            "entries": sum(len(p.messages) for p in self._partitions.values()),
+            "evictions": self.evictions,
+        }
+
+    def _encode(self, text: str) -> np.ndarray:
+        if self._encoder is None:
+            with self._encoder_lock:
+                if self._encoder is None:
+                    # sentence-transformers 导入很慢，第一次用到时再加载
+                    from sentence_transformers import SentenceTransformer
+                    self._encoder = SentenceTransformer(self.model_name)
+        normalized = " ".join(text.lower().split())
+        return self._encoder.encode(normalized, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
@@ -0,0 +1,97 @@
+"""
+顺序执行 vs 并发执行工具调用的耗时对比
+
+使用故意变慢的假工具，不需要调用大模型：
+    python bench_tool_executor.py --calls 6 --delay 0.5
+"""
+import argparse
+import asyncio
+import time
+
+from langchain.tools import tool
+
+from tool_executor import ToolExecutor
+
+
+def make_tools(delay: float):
+    @tool
+    def get_weather(city: str) -> str:
+        """获取指定城市的天气"""
+        time.sleep(delay)
+        return f"{city}：晴，20°C"
+
+    @tool
+    async def get_air_quality(city: str) -> str:
+        """获取指定城市的空气质量"""
+        await asyncio.sleep(delay)
+        return f"{city}：AQI 42"
+
+    @tool
+    def flaky_service(city: str) -> str:
+        """总是失败的上游服务，用来验证错误隔离"""
+        time.sleep(delay / 2)
+        raise ConnectionError("upstream unavailable")
+
+    @tool
+    def hanging_service(city: str) -> str:
+        """总是超时的上游服务，用来验证单个工具的超时"""
+        time.sleep(delay * 10)
+        return "too late"
+
+    return [get_weather, get_air_quality, flaky_service, hanging_service]
+
+
+def make_calls(n: int) -> list[dict]:
+    cities = ["上海", "北京", "广州", "深圳", "杭州", "成都"]
+    calls = [{"name": "get_weather" if i % 2 == 0 else "get_air_quality", "args": {"city": cities[i % len(cities)]},
+              "id": f"call_{i}"} for i in range(n)]
+    calls.append({"name": "flaky_service", "args": {"city": "上海"}, "id": "call_flaky"})
+    calls.append({"name": "hanging_service", "args": {"city": "上海"}, "id": "call_hanging"})
+    return calls
+
+
+def run_sequential(tools, calls):
+    # tool_example.py 原来的写法：逐个调用（这里额外捕获异常，否则一个失败整轮都中断）
+    tool_map = {t.name: t for t in tools}
+    results = []
+    for call in calls:
+        try:
+            results.append(tool_map[call["name"]].invoke(call["args"]))
+        except Exception as e:
+            results.append(repr(e))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="sequential vs concurrent tool execution")
+    parser.add_argument("--calls", type=int, default=6, help="正常工具调用的个数（另外附加一个失败、一个超时的调用）")
+    parser.add_argument("--delay", type=float, default=0.5, help="每个假工具的耗时（秒）")
+    args = parser.parse_args()
+
+    tools = make_tools(args.delay)
+    calls = make_calls(args.calls)
+    # 超时的工具只等 2 倍 delay
+    executor = ToolExecutor(tools, timeouts={"hanging_service": args.delay * 2})
+
+    start = time.perf_counter()
+    run_sequential(tools, calls)
+    print(f"sequential      {time.perf_counter() - start:6.2f}s")
+
+    start = time.perf_counter()
+    messages = executor.run(calls)
+    print(f"thread pool     {time.perf_counter() - start:6.2f}s")
+
+    async def timed_arun():
+        # 在事件循环内部计时：asyncio.run 退出时会等后台线程里超时的工具跑完，那部分不算工具调用耗时
+        start = time.perf_counter()
+        result = await executor.arun(calls)
+        return result, time.perf_counter() - start
+
+    async_messages, elapsed = asyncio.run(timed_arun())
+    print(f"asyncio         {elapsed:6.2f}s")
+
+    assert [m.tool_call_id for m in messages] == [c["id"] for c in calls]
+    assert [m.tool_call_id for m in async_messages] == [c["id"] for c in calls]
+    for message in messages:
+        print(f"  {message.tool_call_id:<13} {message.status:<8} {message.content}")
+    executor.shutdown()
@@ -1,9 +1,10 @@
 from langchain.tools import tool
-from langchain_core.messages import HumanMessage, ToolMessage
+from langchain_core.messages import HumanMessage
 from langchain_openai import ChatOpenAI
 
 import os
 from dotenv import load_dotenv
+from tool_executor import ToolExecutor
 
 load_dotenv()
 
@@ -24,7 +25,6 @@ llm = ChatOpenAI(
     base_url="https://dashscope.aliyuncs.com/compatible-mode/v1")
 
 tools = [get_weather]
-tool_map = {t.name: t for t in tools}
 llm_with_tools = llm.bind_tools(tools)
 
 
@@ -34,21 +34,9 @@ response = llm_with_tools.invoke([
 
 print(response)
 
-tool_messages = []
-
-for call in response.tool_calls:
-    tool_name = call["name"]
-    tool_args = call["args"]
-
-    tool = tool_map[tool_name]
-    result = tool.invoke(tool_args)
-
-    tool_messages.append(
-        ToolMessage(
-            content=str(result),
-            tool_call_id=call["id"]
-        )
-    )
+# 模型一次返回多个工具调用时并发执行，结果按 tool_calls 的顺序返回
+executor = ToolExecutor(tools, default_timeout=10)
+tool_messages = executor.run(response.tool_calls)
 
 print(tool_messages)
 
@@ -0,0 +1,157 @@
+"""
+并发执行一条 AI 消息里的多个工具调用
+
+模型一次可能同时要求调用好几个互不依赖的工具（比如同时查两个城市的天气），
+逐个执行时总耗时是所有工具耗时之和。这里把它们并发执行：
+- run() 使用线程池，arun() 使用 asyncio，两者返回结果一致
+- 每个工具可以单独设置超时，从这个调用真正开始执行时算起（在线程池里排队的时间不算）；
+  超时、报错、找不到工具都只影响这一个调用，转成 status="error" 的 ToolMessage
+- 线程没法强制终止，超时的调用会一直占着线程；出现超时后换一个新的线程池，
+  所有 run()（包括其他并发调用方的）还在旧线程池里排队的调用都会挪到新线程池，卡住的工具不会把执行器耗尽
+- 返回的 ToolMessage 顺序与 tool_calls 的顺序一致，可以直接拼回对话历史
+"""
+import asyncio
+import time
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import BaseTool, StructuredTool
+
+
+def _invoke_sync(tool: BaseTool, args: dict):
+    # 只有 async 实现的工具（@tool 装饰的 async def）不支持 invoke，在工作线程里单独跑一个事件循环
+    if isinstance(tool, StructuredTool) and tool.func is None and tool.coroutine is not None:
+        return asyncio.run(tool.ainvoke(args))
+    return tool.invoke(args)
+
+
+class ToolExecutor:
+    def __init__(self, tools: list[BaseTool], max_workers: int = 8, default_timeout: float = 10.0,
+                 timeouts: dict[str, float] | None = None):
+        """
+        - max_workers: 线程池大小，即同时执行的工具调用数上限
+        - default_timeout: 默认的单个工具超时（秒）
+        - timeouts: 按工具名单独设置的超时，例如 {"search_web": 30}
+        """
+        self.tool_map = {t.name: t for t in tools}
+        self.max_workers = max_workers
+        self.default_timeout = default_timeout
+        self.timeouts = timeouts or {}
+        self.hung = 0  # 超时后仍在后台运行的调用数（累计）
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+        self._generation = 0  # 每换一次线程池加 1，用来找出还排在旧线程池里的调用
+        self._pool_lock = threading.Lock()
+
+    def timeout_for(self, name: str) -> float:
+        return self.timeouts.get(name, self.default_timeout)
+
+    def run(self, tool_calls: list[dict]) -> list[ToolMessage]:
+        """在线程池中并发执行，按原顺序返回 ToolMessage"""
+        messages: list[ToolMessage | None] = [None] * len(tool_calls)
+        started: dict[int, float] = {}  # 调用序号 -> 开始执行的时间，由工作线程写入
+        futures = {}  # future -> 调用序号
+        generations = {}  # future -> 提交时线程池的代数
+        for i, call in enumerate(tool_calls):
+            if call["name"] in self.tool_map:
+                self._submit(i, call, started, futures, generations)
+            else:
+                messages[i] = self._unknown_tool(call)
+
+        while futures:
+            # 线程池可能被这次或其他并发的 run() 换掉了，还在旧线程池里排队的调用挪到新线程池
+            self._migrate(futures, generations, tool_calls, started)
+            now = time.monotonic()
+            expired = [f for f, i in futures.items()
+                       if i in started and now >= started[i] + self.timeout_for(tool_calls[i]["name"])]
+            if expired:
+                for future in expired:
+                    i = futures.pop(future)
+                    generations.pop(future)
+                    messages[i] = self._timeout(tool_calls[i])
+                self._replace_pool(hung=len(expired))
+                continue
+
+            deadlines = [started[i] + self.timeout_for(tool_calls[i]["name"]) for i in futures.values() if i in started]
+            # 还在排队的调用开始执行时不会唤醒 wait，所以有排队的调用时定期醒来检查它们的截止时间
+            timeout = min(deadlines, default=now + 0.05) - now
+            if len(deadlines) < len(futures):
+                timeout = min(timeout, 0.05)
+            done, _ = wait(futures, timeout=max(0.0, timeout), return_when=FIRST_COMPLETED)
+            for future in done:
+                i = futures.pop(future)
+                generations.pop(future)
+                try:
+                    messages[i] = self._success(tool_calls[i], future.result())
+                except Exception as e:
+                    messages[i] = self._failure(tool_calls[i], e)
+        return messages
+
+    def _submit(self, i: int, call: dict, started: dict[int, float], futures: dict, generations: dict):
+        tool = self.tool_map[call["name"]]
+
+        def invoke():
+            started[i] = time.monotonic()
+            return _invoke_sync(tool, call["args"])
+
+        with self._pool_lock:
+            future = self._pool.submit(invoke)
+            generations[future] = self._generation
+        futures[future] = i
+
+    def _migrate(self, futures: dict, generations: dict, tool_calls: list[dict], started: dict[int, float]):
+        for future, i in list(futures.items()):
+            # cancel() 只对还没开始执行的调用生效，已经在跑的留在原线程池里
+            if generations[future] != self._generation and future.cancel():
+                del futures[future], generations[future]
+                self._submit(i, tool_calls[i], started, futures, generations)
+
+    def _replace_pool(self, hung: int):
+        """超时的线程还占着旧线程池：换一个新线程池，旧线程池里排队的调用由各自的 run() 挪过去"""
+        with self._pool_lock:
+            old_pool = self._pool
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool")
+            self._generation += 1
+            self.hung += hung
+        old_pool.shutdown(wait=False)
+
+    async def arun(self, tool_calls: list[dict]) -> list[ToolMessage]:
+        """run() 的 asyncio 版本：异步工具直接 await，同步工具由 LangChain 放到线程里执行"""
+        # 同时执行的调用数同样限制为 max_workers，超时从拿到名额之后开始算
+        semaphore = asyncio.Semaphore(self.max_workers)
+        return list(await asyncio.gather(*(self._ainvoke(call, semaphore) for call in tool_calls)))
+
+    async def _ainvoke(self, call: dict, semaphore: asyncio.Semaphore) -> ToolMessage:
+        tool = self.tool_map.get(call["name"])
+        if tool is None:
+            return self._unknown_tool(call)
+        try:
+            async with semaphore:
+                result = await asyncio.wait_for(tool.ainvoke(call["args"]), self.timeout_for(call["name"]))
+            return self._success(call, result)
+        except asyncio.TimeoutError:
+            return self._timeout(call)
+        except Exception as e:
+            return self._failure(call, e)
+
+    def shutdown(self):
+        with self._pool_lock:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _success(call: dict, result) -> ToolMessage:
+        return ToolMessage(content=str(result), tool_call_id=call["id"], name=call["name"])
+
+    def _timeout(self, call: dict) -> ToolMessage:
+        return ToolMessage(content=f"工具 {call['name']} 执行超时（{self.timeout_for(call['name'])} 秒）",
+                           tool_call_id=call["id"], name=call["name"], status="error")
+
+    @staticmethod
+    def _failure(call: dict, error: Exception) -> ToolMessage:
+        return ToolMessage(content=f"工具 {call['name']} 执行失败：{error!r}",
+                           tool_call_id=call["id"], name=call["name"], status="error")
+
+    @staticmethod
+    def _unknown_tool(call: dict) -> ToolMessage:
+        return ToolMessage(content=f"找不到工具 {call['name']}",
+                           tool_call_id=call["id"], name=call["name"], status="error")
@@ -0,0 +1,207 @@
+"""
+多步工具调用循环 + 工具结果备忘录
+
+tool_example.py 只做一轮工具调用；真实的 Agent 需要反复"模型 → 工具 → 模型"，
+而模型经常在后面的步骤里重复发出一模一样的调用（比如又查一次 get_weather("上海")）。
+
+- 每次对话一个 ToolMemo，按 (工具名, 规范化参数) 记录可缓存工具的结果，重复调用直接复用
+- 工具通过 cacheable() 声明自己可以缓存：结果只取决于参数、没有副作用
+- 同一步里的重复调用只执行一次；某一步的调用全部是本次已经执行过的，说明模型在原地打转，
+  直接用已有结果并要求模型给出最终答复，不再提供工具
+- max_steps 限制最多的"模型 → 工具"轮数，用完后同样要求模型直接作答
+"""
+import json
+import os
+from dataclasses import dataclass, field
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.tools import BaseTool
+
+from tool_executor import ToolExecutor
+
+
+def cacheable(tool: BaseTool) -> BaseTool:
+    """
+    声明工具结果可以缓存，写在 @tool 上面：
+        @cacheable
+        @tool
+        def get_weather(city: str) -> str: ...
+    """
+    tool.metadata = {**(tool.metadata or {}), "cacheable": True}
+    return tool
+
+
+def is_cacheable(tool: BaseTool | None) -> bool:
+    return bool(tool is not None and tool.metadata and tool.metadata.get("cacheable"))
+
+
+def canonical_args(args: dict) -> str:
+    """参数规范化：键排序、字符串去掉首尾空白，{"city": " 上海"} 和 {"city": "上海"} 是同一个调用"""
+    def clean(value):
+        if isinstance(value, str):
+            return value.strip()
+        if isinstance(value, dict):
+            return {k: clean(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [clean(v) for v in value]
+        return value
+
+    return json.dumps(clean(args), ensure_ascii=False, sort_keys=True)
+
+
+@dataclass
+class LoopStats:
+    llm_calls: int = 0
+    tool_calls_requested: int = 0   # 模型一共要求的工具调用次数
+    tool_calls_executed: int = 0    # 实际执行的次数
+    memo_hits: int = 0              # 之前步骤 / 之前轮次已经有结果的调用
+    duplicate_in_step: int = 0      # 同一步里重复的调用
+    repeat_cuts: int = 0            # 因模型原地打转而提前收尾的次数
+    llm_calls_saved: int = 0        # 提前收尾时还没用掉的步数（省下的 LLM 往返的上限）
+    budget_exhausted: bool = False
+
+    @property
+    def tool_calls_saved(self) -> int:
+        return self.tool_calls_requested - self.tool_calls_executed
+
+    def summary(self) -> str:
+        return (f"llm_calls={self.llm_calls} tool_calls requested={self.tool_calls_requested} "
+                f"executed={self.tool_calls_executed} saved={self.tool_calls_saved} "
+                f"(memo_hits={self.memo_hits} duplicate_in_step={self.duplicate_in_step}) "
+                f"repeat_cuts={self.repeat_cuts} llm_calls_saved<={self.llm_calls_saved} "
+                f"budget_exhausted={self.budget_exhausted}")
+
+
+@dataclass
+class ToolMemo:
+    """一次对话内可缓存工具的结果，跨多轮问答保留"""
+    results: dict[tuple[str, str], str] = field(default_factory=dict)
+
+    def get(self, key: tuple[str, str]) -> str | None:
+        return self.results.get(key)
+
+    def put(self, key: tuple[str, str], content: str):
+        self.results[key] = content
+
+
+class ToolLoop:
+    def __init__(self, llm, tools: list[BaseTool], max_steps: int = 5, executor: ToolExecutor | None = None):
+        """
+        - llm: 支持 bind_tools 的聊天模型
+        - max_steps: 最多进行多少轮"模型 → 工具"
+        - executor: 执行同一步里多个工具调用的并发执行器
+        """
+        self.llm_with_tools = llm.bind_tools(tools)
+        # 收尾时仍然带上工具定义（历史里有工具调用，很多 OpenAI 兼容服务要求同时提供 tools），
+        # 但用 tool_choice="none" 禁止模型继续调用工具
+        self.llm_final = llm.bind_tools(tools, tool_choice="none")
+        self.tool_map = {t.name: t for t in tools}
+        self.max_steps = max_steps
+        self.executor = executor or ToolExecutor(tools)
+
+    def run(self, messages: list[BaseMessage], memo: ToolMemo | None = None) -> tuple[AIMessage, LoopStats]:
+        """
+        执行工具循环，新产生的消息会追加到 messages 中，返回 (最终回复, 统计)
+        - memo: 同一次对话的备忘录，多轮问答之间传入同一个实例
+        """
+        memo = memo if memo is not None else ToolMemo()
+        stats = LoopStats()
+        seen_this_run: set[tuple[str, str]] = set()
+
+        for step in range(self.max_steps):
+            response = self.llm_with_tools.invoke(messages)
+            stats.llm_calls += 1
+            messages.append(response)
+            if not response.tool_calls:
+                return response, stats
+
+            keys = [(call["name"], canonical_args(call["args"])) for call in response.tool_calls]
+            stats.tool_calls_requested += len(keys)
+            repeating = all(key in seen_this_run for key in keys)
+
+            messages.extend(self._execute(response.tool_calls, keys, memo, stats))
+            seen_this_run.update(keys)
+
+            if repeating:
+                # 模型把本次已经做过的调用原样再发一遍：结果已经都在上下文里了，直接要求作答
+                stats.repeat_cuts += 1
+                stats.llm_calls_saved += self.max_steps - step - 1
+                break
+        else:
+            stats.budget_exhausted = True
+
+        # 不允许再调用工具，模型只能根据已有的工具结果给出最终答复
+        final = self.llm_final.invoke(messages)
+        stats.llm_calls += 1
+        messages.append(final)
+        return final, stats
+
+    def _execute(self, tool_calls: list[dict], keys: list[tuple[str, str]], memo: ToolMemo,
+                 stats: LoopStats) -> list[ToolMessage]:
+        """先查备忘录，剩下的调用（同一步内去重后）交给执行器并发执行，按原顺序返回"""
+        to_run: dict[tuple[str, str], dict] = {}  # 真正需要执行的调用
+        run_keys: list[tuple[str, str] | None] = []  # 每个调用对应 to_run 中的哪一个，None 表示备忘录命中
+        for call, key in zip(tool_calls, keys):
+            if is_cacheable(self.tool_map.get(call["name"])):
+                if memo.get(key) is not None:
+                    stats.memo_hits += 1
+                    run_keys.append(None)
+                    continue
+                if key in to_run:
+                    stats.duplicate_in_step += 1
+                run_key = key
+            else:
+                # 不可缓存的工具（可能有副作用）每次都执行
+                run_key = ("", call["id"])
+            to_run.setdefault(run_key, call)
+            run_keys.append(run_key)
+
+        executed = dict(zip(to_run, self.executor.run(list(to_run.values()))))
+        stats.tool_calls_executed += len(executed)
+
+        messages = []
+        for call, key, run_key in zip(tool_calls, keys, run_keys):
+            if run_key is None:
+                messages.append(ToolMessage(content=memo.get(key), tool_call_id=call["id"], name=call["name"]))
+                continue
+            message = executed[run_key]
+            if run_key == key and message.status != "error":
+                memo.put(key, message.content)
+            # 同一步里的重复调用共用一次执行结果，但每个调用都要有自己的 tool_call_id
+            if message.tool_call_id != call["id"]:
+                message = message.model_copy(update={"tool_call_id": call["id"]})
+            messages.append(message)
+        return messages
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from langchain.tools import tool
+    from langchain_openai import ChatOpenAI
+
+    load_dotenv()
+
+    assert os.getenv("OPENAI_API_KEY"), "请先配置 OPENAI_API_KEY"
+
+    @cacheable
+    @tool
+    def get_weather(city: str) -> str:
+        """当用户询问实时天气情况时，使用该工具获取指定城市的天气信息。"""
+        fake_weather_db = {
+            "上海": "小雨，湿度 90%",
+            "北京": "晴，温度 10°C"
+        }
+        return fake_weather_db.get(city, "未查询到该城市天气")
+
+    llm = ChatOpenAI(
+        model="qwen-max",
+        base_url=os.getenv("OPENAI_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"))
+
+    loop = ToolLoop(llm, [get_weather], max_steps=4)
+    memo = ToolMemo()
+    messages = []
+    for question in ["帮我查一下今天上海的天气，顺便判断适不适合洗车", "那北京和上海哪个更适合出门跑步？"]:
+        messages.append(HumanMessage(content=question))
+        answer, stats = loop.run(messages, memo)
+        print(answer.content)
+        print(f"[tool_loop] {stats.summary()}")
@@ -0,0 +1,196 @@
+"""
+城市指南 / 景点数据的存储
+
+启动时把 guides 目录下的 Markdown / JSON 文件一次性读进内存，按规范化后的城市名和别名建立索引，
+"Xi'an"、"xian"、"西安"、"西安市" 都能找到同一份指南，拼写略有出入时再做一次模糊匹配。
+文件有改动时自动重新加载（按间隔检查目录，不需要重启服务）；每份指南带一个内容哈希作为 ETag，
+客户端可以先取元数据，ETag 没变就不用重新拉取全文。
+模糊匹配只容忍拼写错误（1~2 个字符的编辑距离），"Xiamen" 不会被当成 "Xian"，找不到时返回 None。
+
+Markdown 文件格式（和 SKILL.md 一样使用 front matter）：
+    ---
+    name: 西安
+    aliases: Xi'an, Chang'an, 长安
+    attractions: 秦始皇陵兵马俑, 大雁塔, 西安城墙
+    ---
+    # 西安旅游深度指南
+    ...
+
+JSON 文件格式：
+    {"name": "北京", "aliases": ["Beijing"], "attractions": ["故宫"], "guide": "# 北京旅游指南 ..."}
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+
+_IGNORED_CHARS = re.compile(r"[\s'’`\-_.·]+")
+_CITY_SUFFIXES = ("市", " city")
+
+
+def normalize_city(name: str) -> str:
+    """全半角统一、忽略大小写、去掉空格和撇号等符号，以及"市"/"city"后缀"""
+    key = unicodedata.normalize("NFKC", name).casefold().strip()
+    for suffix in _CITY_SUFFIXES:
+        if key.endswith(suffix) and len(key) > len(suffix):
+            key = key[: -len(suffix)]
+    return _IGNORED_CHARS.sub("", key)
+
+
+@dataclass(frozen=True)
+class CityGuide:
+    name: str
+    aliases: tuple[str, ...]
+    attractions: str  # 预先排版好的景点列表
+    guide: str
+    etag: str         # 内容哈希，内容不变 ETag 就不变
+    source: str
+    updated_at: float
+
+    def meta(self, version: int) -> dict:
+        return {"name": self.name, "aliases": list(self.aliases), "etag": self.etag,
+                "version": version, "updated_at": self.updated_at, "source": self.source}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein 编辑距离，超过 limit 时提前返回 limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _split_list(value) -> list[str]:
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in re.split(r"[,，]", value or "") if v.strip()]
+
+
+def parse_guide_file(path: Path) -> CityGuide:
+    raw = path.read_bytes()
+    text = raw.decode("utf-8")
+    if path.suffix == ".json":
+        data = json.loads(text)
+        # 顶层不是对象（比如误写成列表）时当作格式错误，由 reload 跳过这个文件
+        if not isinstance(data, dict):
+            raise ValueError(f"顶层必须是 JSON 对象，实际是 {type(data).__name__}")
+        guide = data.get("guide", "")
+        if not isinstance(guide, str):
+            raise ValueError(f"guide 必须是字符串，实际是 {type(guide).__name__}")
+    else:
+        data = {}
+        guide = text
+        if text.startswith("---"):
+            _, front_matter, guide = text.split("---", 2)
+            for line in front_matter.strip().splitlines():
+                key, _, value = line.partition(":")
+                data[key.strip()] = value.strip()
+
+    name = data.get("name") or path.stem
+    attractions = _split_list(data.get("attractions"))
+    return CityGuide(
+        name=name,
+        aliases=tuple(_split_list(data.get("aliases"))),
+        attractions="\n".join(f"{i}. {a}" for i, a in enumerate(attractions, 1)),
+        guide=guide.strip(),
+        etag=hashlib.sha256(raw).hexdigest()[:16],
+        source=path.name,
+        updated_at=path.stat().st_mtime,
+    )
+
+
+class GuideStore:
+    def __init__(self, root: str | Path, reload_interval: float = 2.0, fuzzy_min_length: int = 5):
+        """
+        - reload_interval: 两次检查目录是否有改动的最小间隔（秒），0 表示每次查询都检查
+        - fuzzy_min_length: 规范化后的城市名至少这么长才做模糊匹配（短名字差一个字母往往就是另一个城市），
+          长度不到 9 时最多容忍 1 处拼写错误，更长的名字最多 2 处
+        """
+        self.root = Path(root)
+        self.reload_interval = reload_interval
+        self.fuzzy_min_length = fuzzy_min_length
+        self.version = 0
+        self.guides: list[CityGuide] = []
+        self._index: dict[str, CityGuide] = {}
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self, force: bool = True) -> bool:
+        """重新扫描目录；文件没有变化时直接返回 False"""
+        with self._lock:
+            files, signature = [], []
+            for path in sorted(p for p in self.root.glob("*") if p.suffix in (".md", ".json") and p.is_file()):
+                try:
+                    st = path.stat()
+                except FileNotFoundError:
+                    # 扫描过程中文件被删除
+                    continue
+                files.append(path)
+                signature.append((path.name, st.st_mtime_ns, st.st_size))
+            signature = tuple(signature)
+            self._checked_at = time.monotonic()
+            if not force and signature == self._signature:
+                return False
+
+            guides, index = [], {}
+            for path in files:
+                try:
+                    guide = parse_guide_file(path)
+                except (OSError, ValueError) as e:
+                    # 单个文件写到一半或格式错误，不影响其他城市
+                    print(f"[guides] 跳过 {path.name}: {e}")
+                    continue
+                guides.append(guide)
+                for name in (guide.name, *guide.aliases):
+                    index.setdefault(normalize_city(name), guide)
+
+            # 整体替换引用，查询方不会看到加载了一半的索引
+            self.guides, self._index = guides, index
+            self._signature = signature
+            self.version += 1
+            return True
+
+    def lookup(self, city: str) -> CityGuide | None:
+        if time.monotonic() - self._checked_at >= self.reload_interval:
+            self.reload(force=False)
+        index = self._index
+        key = normalize_city(city)
+        guide = index.get(key)
+        if guide is None and len(key) >= self.fuzzy_min_length:
+            guide = self._fuzzy_match(key, index)
+        return guide
+
+    def _fuzzy_match(self, key: str, index: dict[str, CityGuide]) -> CityGuide | None:
+        """只在拼写错误的范围内匹配；有多个城市同样接近时宁可不匹配"""
+        limit = 1 if len(key) < 9 else 2
+        best, best_distance, ambiguous = None, limit + 1, False
+        for name, guide in index.items():
+            if len(name) < self.fuzzy_min_length:
+                continue
+            distance = edit_distance(key, name, limit)
+            if distance < best_distance:
+                best, best_distance, ambiguous = guide, distance, False
+            elif distance == best_distance and guide is not best:
+                ambiguous = True
+        return None if ambiguous else best
+
+    def catalog(self) -> dict:
+        """所有城市的元数据和整体 ETag，客户端可以据此判断哪些指南需要重新拉取"""
+        if time.monotonic() - self._checked_at >= self.reload_interval:
+            self.reload(force=False)
+        guides = self.guides
+        etag = hashlib.sha256("".join(g.etag for g in guides).encode()).hexdigest()[:16]
+        return {"version": self.version, "etag": etag, "cities": [g.meta(self.version) for g in guides]}
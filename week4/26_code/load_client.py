@@ -0,0 +1,133 @@
+"""
+travel_server 的 MCP 客户端压测：多个客户端并发调用工具，统计 requests/s 和尾延迟
+
+用法：
+    # 压测已经启动的服务
+    python load_client.py --url http://127.0.0.1:8080/mcp --clients 32 --requests 50
+    # 依次以 1 / 2 / 4 个 worker 启动服务并压测，对比扩展效果
+    python load_client.py --scale 1,2,4 --processes 4
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fastmcp import Client
+
+SERVER_SCRIPT = Path(__file__).resolve().parent / "travel_server.py"
+
+CITIES = ["西安", "巴黎", "北京", "Xi'an", "Paris"]
+DATES = ["2026-05-01", "2026-05-02", "2026-05-03"]
+
+
+def random_call() -> tuple[str, dict]:
+    """参数取值范围很小，可以观察到缓存命中；plan_trip 权重较低"""
+    city, date = random.choice(CITIES), random.choice(DATES)
+    return random.choice([
+        ("search_flights", {"origin": "上海", "destination": city, "date": date}),
+        ("find_hotels", {"city": city, "checkin_date": date, "budget_range": "500-1000"}),
+        ("get_weather", {"city": city, "date": date}),
+        ("plan_route", {"start": "酒店", "end": random.choice(["大雁塔", "卢浮宫", "故宫"])}),
+        ("plan_trip", {"origin": "上海", "destination": city, "date": date}),
+    ])
+
+
+async def run_client(url: str, requests: int, latencies: list[float], errors: list[str]):
+    async with Client(url) as client:
+        for _ in range(requests):
+            name, args = random_call()
+            start = time.perf_counter()
+            try:
+                await client.call_tool(name, args)
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                errors.append(repr(e))
+
+
+def run_process(url: str, clients: int, requests: int) -> tuple[list[float], list[str]]:
+    """一个压测进程：在同一个事件循环里跑 clients 个客户端"""
+    latencies, errors = [], []
+
+    async def main():
+        await asyncio.gather(*(run_client(url, requests, latencies, errors) for _ in range(clients)))
+
+    asyncio.run(main())
+    return latencies, errors
+
+
+def run_load(url: str, clients: int, requests: int, processes: int) -> dict:
+    # 压测端本身也会吃满 CPU，多开几个进程，避免客户端成为瓶颈
+    per_process = [clients // processes + (i < clients % processes) for i in range(processes)]
+    start = time.perf_counter()
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.starmap(run_process, [(url, n, requests) for n in per_process if n])
+    wall = time.perf_counter() - start
+
+    latencies = sorted(l for result, _ in results for l in result)
+    errors = [e for _, result in results for e in result]
+    pct = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000 if latencies else float("nan")
+    return {"requests": len(latencies), "errors": len(errors), "wall": wall,
+            "rps": len(latencies) / wall, "p50": pct(0.5), "p95": pct(0.95), "p99": pct(0.99),
+            "first_error": errors[0] if errors else None}
+
+
+def wait_for_port(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"travel_server did not start on port {port}")
+
+
+def start_server(workers: int, cache_db: str) -> tuple[subprocess.Popen, int]:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    env = {**os.environ, "WORKERS": str(workers), "HOST": "127.0.0.1", "PORT": str(port), "TOOL_CACHE_DB": cache_db}
+    process = subprocess.Popen([sys.executable, str(SERVER_SCRIPT)], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(port)
+    return process, port
+
+
+def print_result(label: str, result: dict):
+    print(f"{label:<12} requests={result['requests']:<6} errors={result['errors']:<4} "
+          f"rps={result['rps']:8.1f} p50={result['p50']:7.1f}ms p95={result['p95']:7.1f}ms "
+          f"p99={result['p99']:7.1f}ms")
+    if result["first_error"]:
+        print(f"             first error: {result['first_error']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MCP load generator for travel_server")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/mcp")
+    parser.add_argument("--clients", type=int, default=32, help="并发客户端数")
+    parser.add_argument("--requests", type=int, default=50, help="每个客户端的调用次数")
+    parser.add_argument("--processes", type=int, default=2, help="压测端进程数")
+    parser.add_argument("--scale", help="逗号分隔的 worker 数，例如 1,2,4：依次启动服务并压测")
+    args = parser.parse_args()
+
+    if not args.scale:
+        print_result("server", run_load(args.url, args.clients, args.requests, args.processes))
+        sys.exit()
+
+    for workers in [int(n) for n in args.scale.split(",")]:
+        with tempfile.TemporaryDirectory() as tmp:
+            process, port = start_server(workers, os.path.join(tmp, "tool_cache.db"))
+            try:
+                result = run_load(f"http://127.0.0.1:{port}/mcp", args.clients, args.requests, args.processes)
+            finally:
+                # 和 Ctrl+C 一样发送 SIGINT，走服务端的优雅退出流程
+                process.send_signal(signal.SIGINT)
+                process.wait(timeout=30)
+        print_result(f"workers={workers}", result)
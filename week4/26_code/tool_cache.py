@@ -0,0 +1,230 @@
+"""
+MCP 工具结果缓存
+
+Agent 经常用完全相同的参数重复调用同一个工具（比如同一天同一航线的航班），
+而这些工具背后是又慢又按次计费的上游 API。这里提供一个按工具配置的缓存：
+
+- key 由规范化后的参数组成：补齐默认值、字符串去首尾空白并忽略大小写
+- 每个工具有自己的 TTL、最大条目数和最大字节数，超出时按 LRU 淘汰
+- single-flight：同一个 key 的并发调用只向上游发一次请求，其余调用等待同一个结果
+- 多进程部署时可以再挂一层 SqliteCacheBackend，各 worker 通过同一个本地 SQLite 文件共享结果
+"""
+import asyncio
+import functools
+import inspect
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+
+def normalize(value):
+    """参数规范化：" 西安 " 和 "西安"、"Economy" 和 "economy" 视为同一个参数"""
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    if isinstance(value, dict):
+        return {str(k): normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(v) for v in value]
+    return value
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0  # 等待同一个进行中请求、没有重复访问上游的调用次数
+    shared_hits: int = 0  # 本进程没有、从共享缓存（其他 worker 写入）取到的次数
+    evictions: int = 0
+    expired: int = 0
+    errors: int = 0
+
+
+class SqliteCacheBackend:
+    """
+    跨进程共享的二级缓存：多个 worker 进程读写同一个 SQLite 文件（WAL 模式，读写互不阻塞）
+    过期时间使用墙上时钟，各进程之间可以直接比较
+    get / put 是阻塞调用，ToolCache 会放到线程里执行；数据库被其他进程锁住时最多等 busy_timeout 秒，
+    超时就当作没命中 / 不写入，共享缓存只是优化，不能拖慢工具调用
+    """
+
+    def __init__(self, path: str, prune_every: int = 256, busy_timeout: float = 0.1):
+        self.path = path
+        self.prune_every = prune_every
+        self.busy = 0  # 因为数据库被锁住而放弃的读写次数
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tool_cache ("
+            "tool TEXT NOT NULL, key TEXT NOT NULL, expires_at REAL NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (tool, key))"
+        )
+
+    def get(self, tool: str, key: str) -> tuple[object, float] | None:
+        """返回 (结果, 剩余有效秒数)，没有、已过期或数据库忙时返回 None"""
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM tool_cache WHERE tool = ? AND key = ?", (tool, key)
+                ).fetchone()
+            except sqlite3.OperationalError:
+                self.busy += 1
+                return None
+        if row is None:
+            return None
+        remaining = row[1] - time.time()
+        return (json.loads(row[0]), remaining) if remaining > 0 else None
+
+    def put(self, tool: str, key: str, value: str, ttl: float, max_entries: int):
+        """写入共享缓存，数据库忙时直接放弃这次写入"""
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO tool_cache (tool, key, expires_at, value) VALUES (?, ?, ?, ?)",
+                    (tool, key, time.time() + ttl, value),
+                )
+                self._writes += 1
+                # 不必每次写入都清理：攒够一批写入后，删掉过期条目和超出上限的最旧条目
+                if self._writes % self.prune_every == 0:
+                    self._conn.execute("DELETE FROM tool_cache WHERE expires_at <= ?", (time.time(),))
+                    self._conn.execute(
+                        "DELETE FROM tool_cache WHERE tool = ? AND key NOT IN "
+                        "(SELECT key FROM tool_cache WHERE tool = ? ORDER BY expires_at DESC LIMIT ?)",
+                        (tool, tool, max_entries),
+                    )
+            except sqlite3.OperationalError:
+                self.busy += 1
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ToolCache:
+    """单个工具的缓存，只在事件循环线程里使用，不需要加锁"""
+
+    def __init__(self, name: str, ttl: float, max_entries: int = 1024, max_bytes: int = 8 * 1024 * 1024,
+                 backend: SqliteCacheBackend | None = None):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.backend = backend
+        self.total_bytes = 0
+        self.stats = CacheStats()
+        self._entries: OrderedDict[str, tuple[float, int, object]] = OrderedDict()  # key -> (过期时间, 字节数, 结果)
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def get_or_call(self, key: str, call):
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, size, result = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return result
+            self._remove(key)
+            self.stats.expired += 1
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats.coalesced += 1
+        else:
+            inflight = asyncio.ensure_future(self._fill(key, call))
+            # 所有等待者都已超时离开时，避免 "exception was never retrieved" 警告
+            inflight.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = inflight
+        # shield：调用方超时或被取消时，上游请求继续执行并写入缓存，其他等待者也不受影响
+        return await asyncio.shield(inflight)
+
+    async def _fill(self, key: str, call):
+        try:
+            if self.backend is not None:
+                # 查共享缓存也算在 single-flight 里：同一个 key 的并发调用只查一次
+                shared = await asyncio.to_thread(self.backend.get, self.name, key)
+                if shared is not None:
+                    result, remaining = shared
+                    self._put(key, result, remaining)
+                    self.stats.shared_hits += 1
+                    return result
+            self.stats.misses += 1
+            result = await call()
+        except Exception:
+            # 失败的结果不缓存，等待中的调用一起收到这个异常
+            self.stats.errors += 1
+            raise
+        else:
+            encoded = self._put(key, result, self.ttl)
+            if self.backend is not None and encoded is not None:
+                await asyncio.to_thread(self.backend.put, self.name, key, encoded, self.ttl, self.max_entries)
+            return result
+        finally:
+            del self._inflight[key]
+
+    def info(self) -> dict:
+        served = self.stats.hits + self.stats.coalesced + self.stats.shared_hits
+        lookups = served + self.stats.misses
+        return {
+            **vars(self.stats),
+            "hit_rate": served / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "total_bytes": self.total_bytes,
+            "ttl": self.ttl,
+        }
+
+    def _put(self, key: str, result, ttl: float) -> str | None:
+        """写入本进程缓存，返回序列化后的结果（供共享缓存复用）；结果过大不缓存时返回 None"""
+        encoded = json.dumps(result, ensure_ascii=False, default=str)
+        size = len(encoded.encode())
+        if size > self.max_bytes:
+            return None
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, size, result)
+        self.total_bytes += size
+        while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.stats.evictions += 1
+        return encoded
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self.total_bytes -= size
+
+
+class ToolCacheRegistry:
+    def __init__(self, backend: SqliteCacheBackend | None = None):
+        """backend: 可选的跨进程共享缓存，不传则只有进程内缓存"""
+        self.backend = backend
+        self.caches: dict[str, ToolCache] = {}
+
+    def cached(self, ttl: float, max_entries: int = 1024, max_bytes: int = 8 * 1024 * 1024):
+        """
+        给异步工具函数加缓存，需要写在 @mcp.tool() 下面：
+            @mcp.tool()
+            @tool_cache.cached(ttl=60)
+            async def search_flights(...): ...
+        """
+        def decorator(fn):
+            cache = ToolCache(fn.__name__, ttl, max_entries, max_bytes, self.backend)
+            self.caches[fn.__name__] = cache
+            signature = inspect.signature(fn)
+
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                key = json.dumps(normalize(bound.arguments), ensure_ascii=False, sort_keys=True, default=str)
+                return await cache.get_or_call(key, lambda: fn(*args, **kwargs))
+
+            return wrapper
+
+        return decorator
+
+    def stats(self) -> dict:
+        return {name: cache.info() for name, cache in self.caches.items()}
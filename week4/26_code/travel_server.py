@@ -1,10 +1,28 @@
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+
 from fastmcp import FastMCP
+from guide_store import GuideStore
+from tool_cache import SqliteCacheBackend, ToolCacheRegistry
 
 # 初始化 MCP 服务
 mcp = FastMCP("TravelPlanner")
 
+# 工具结果缓存：相同参数的重复调用直接返回，并发的相同调用合并成一次上游请求
+# TTL 按数据的变化频率设置：航班价格变化快，路线基本不变
+# 多 worker 部署时（WORKERS>1）各进程再通过同一个 SQLite 文件共享工具缓存
+TOOL_CACHE_DB = os.getenv("TOOL_CACHE_DB")
+tool_cache = ToolCacheRegistry(SqliteCacheBackend(TOOL_CACHE_DB) if TOOL_CACHE_DB else None)
+
+# 城市指南和景点数据：启动时从 guides 目录加载到内存，文件改动后自动重新加载
+guide_store = GuideStore(os.getenv("GUIDES_DIR", Path(__file__).parent / "guides"))
+
 
 @mcp.tool()
+@tool_cache.cached(ttl=60)
 async def search_flights(origin: str, destination: str, date: str, cabin_class: str = "Economy"):
     """
     查询航班信息。
@@ -23,6 +41,7 @@ async def search_flights(origin: str, destination: str, date: str, cabin_class:
     }
 
 @mcp.tool()
+@tool_cache.cached(ttl=300)
 async def find_hotels(city: str, checkin_date: str, budget_range: str):
     """
     查询酒店及价格。
@@ -36,6 +55,7 @@ async def find_hotels(city: str, checkin_date: str, budget_range: str):
     ]
 
 @mcp.tool()
+@tool_cache.cached(ttl=600)
 async def get_weather(city: str, date: str):
     """
     获取目的地天气。
@@ -45,6 +65,7 @@ async def get_weather(city: str, date: str):
     return {"city": city, "date": date, "forecast": "晴朗", "temp": "15°C - 22°C"}
 
 @mcp.tool()
+@tool_cache.cached(ttl=3600)
 async def plan_route(start: str, end: str, mode: str = "transit"):
     """
     规划景点间的交通路线。
@@ -54,15 +75,70 @@ async def plan_route(start: str, end: str, mode: str = "transit"):
     """
     return f"从 {start} 到 {end} 的 {mode} 方案：预计耗时 30 分钟，距离 5 公里。"
 
+
+# plan_trip 中每个子调用的超时（秒）：某个上游慢或者挂了，不拖累整个行程规划
+PLAN_TRIP_TIMEOUTS = {"flights": 8.0, "hotels": 8.0, "weather": 3.0, "attractions": 2.0}
+
+
+async def _run_subcall(name: str, call, timeout: float) -> dict:
+    start = time.perf_counter()
+    try:
+        result = {"status": "ok", "data": await asyncio.wait_for(call, timeout)}
+    except asyncio.TimeoutError:
+        result = {"status": "timeout", "error": f"{timeout}s 内未返回"}
+    except Exception as e:
+        result = {"status": "error", "error": repr(e)}
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+@mcp.tool()
+async def plan_trip(origin: str, destination: str, date: str, budget_range: str = "500-1000",
+                    cabin_class: str = "Economy"):
+    """
+    一次性规划行程：同时查询航班、酒店、目的地天气和热门景点，合并返回。
+    需要完整行程信息时优先使用本工具，而不是逐个调用上面的工具。
+    某一项超时或失败时，其余结果照常返回，失败项列在 errors 中。
+    :param origin: 出发城市
+    :param destination: 目的地城市
+    :param date: 出发日期 (YYYY-MM-DD)，同时作为入住日期
+    :param budget_range: 酒店预算范围 (如 "500-1000")
+    :param cabin_class: 舱位 (Economy, Business, First)
+    """
+    # 直接调用各工具的原始函数（.fn），同样经过结果缓存
+    subcalls = {
+        "flights": search_flights.fn(origin, destination, date, cabin_class),
+        "hotels": find_hotels.fn(destination, date, budget_range),
+        "weather": get_weather.fn(destination, date),
+        "attractions": asyncio.to_thread(get_attractions.fn, destination),
+    }
+    results = await asyncio.gather(
+        *(_run_subcall(name, call, PLAN_TRIP_TIMEOUTS[name]) for name, call in subcalls.items())
+    )
+    results = dict(zip(subcalls, results))
+
+    errors = {name: r["error"] for name, r in results.items() if r["status"] != "ok"}
+    return {
+        "origin": origin,
+        "destination": destination,
+        "date": date,
+        **{name: r.get("data") for name, r in results.items()},
+        "status": "partial" if errors else "success",
+        "errors": errors,
+        "elapsed_ms": {name: r["elapsed_ms"] for name, r in results.items()},
+    }
+
 # --- RESOURCES (资源：提供结构化数据参考) ---
+@mcp.resource("stats://cache")
+def get_cache_stats() -> str:
+    """各工具缓存的命中、未命中、合并请求次数"""
+    return json.dumps(tool_cache.stats(), ensure_ascii=False, indent=2)
+
 @mcp.resource("attractions://{city}")
 def get_attractions(city: str) -> str:
     """获取城市热门景点列表"""
-    data = {
-        "西安": "1. 秦始皇陵兵马俑\n2. 大雁塔\n3. 西安城墙",
-        "巴黎": "1. 埃菲尔铁塔\n2. 卢浮宫\n3. 凯旋门"
-    }
-    return data.get(city, "暂无景点数据。")
+    guide = guide_store.lookup(city)
+    return guide.attractions if guide and guide.attractions else "暂无景点数据。"
 
 @mcp.resource("guides://{city}")
 def get_city_guide(city: str) -> str:
@@ -70,42 +146,43 @@ def get_city_guide(city: str) -> str:
     获取城市的背景文化介绍。
     包含：文化底蕴、当地礼仪、必吃美食。
     """
-    # 模拟从数据库或 Markdown 文件加载内容
-    guides = {
-        "西安": """
-# 西安旅游深度指南
-
-## 🏛 文化底蕴
-西安（古称长安）是十三朝古都，丝绸之路的起点。这里的每一寸土地都充满了历史感。
-
-## 🥢 必吃美食
-* **肉夹馍**：被称为“中国式汉堡”。
-* **羊肉泡馍**：推荐去回民街尝试，记得自己动手掰馍。
-* **凉皮**：酸辣爽口，夏季必备。
-
-## ⚠️ 旅游礼仪与建议
-* **尊重习俗**：在回民街游览时，请尊重穆斯林的宗教信仰和生活习惯。
-* **避开高峰**：城墙骑行建议选在傍晚，可以看落日，且避开高温。
-        """,
-        "巴黎": """
-# 巴黎旅游深度指南
-
-## 🎨 文化底蕴
-艺术之都与时尚之都。不仅有海明威笔下“流动的盛宴”，还有世界顶级的艺术馆。
-
-## 🥐 必吃美食
-* **法式长棍面包 (Baguette)**：随处可见的灵魂美食。
-* **马卡龙**：Ladurée 或 Pierre Hermé 是经典之选。
-* **油封鸭 (Confit de Canard)**：经典的法式主菜。
-
-## ⚠️ 旅游礼仪与建议
-* **问候礼仪**：进入商店时，先说一句 "Bonjour" 是非常基本的礼貌。
-* **用餐节奏**：法国人用餐时间较长，不要催促服务员结账。
-        """
-    }
-    
-    return guides.get(city, f"抱歉，目前还没有关于 {city} 的详细文化指南，建议查阅维基百科。")
+    guide = guide_store.lookup(city)
+    if guide is None:
+        return f"抱歉，目前还没有关于 {city} 的详细文化指南，建议查阅维基百科。"
+    return guide.guide
+
+@mcp.resource("guides://{city}/meta")
+def get_city_guide_meta(city: str) -> str:
+    """城市指南的元数据（标准名称、别名、ETag、版本），ETag 没变时不必重新获取全文"""
+    guide = guide_store.lookup(city)
+    return json.dumps(guide.meta(guide_store.version) if guide else {"name": city, "etag": None},
+                      ensure_ascii=False)
+
+@mcp.resource("catalog://guides")
+def get_guide_catalog() -> str:
+    """所有已收录城市的指南元数据"""
+    return json.dumps(guide_store.catalog(), ensure_ascii=False, indent=2)
+
+
+# 部署方式：默认单进程；WORKERS=N 时启动 N 个 worker 进程监听同一个端口
+WORKERS = int(os.getenv("WORKERS", "1"))
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8080"))
+
+
+def create_app():
+    """多 worker 模式下每个进程调用一次。同一会话的请求可能落到不同 worker，所以使用无状态 HTTP"""
+    return mcp.http_app(stateless_http=True)
 
 
 if __name__ == "__main__":
-    mcp.run(transport="http", host="0.0.0.0", port=8080)
\ No newline at end of file
+    if WORKERS > 1:
+        import uvicorn
+
+        # 子进程会继承环境变量，在这里为所有 worker 指定同一个共享缓存文件
+        os.environ.setdefault("TOOL_CACHE_DB", str(Path(__file__).parent / "tool_cache.db"))
+        # Ctrl+C / SIGTERM 时先停止接收新连接，进行中的请求最多再等 10 秒
+        uvicorn.run("travel_server:create_app", factory=True, app_dir=str(Path(__file__).parent),
+                    host=HOST, port=PORT, workers=WORKERS, timeout_graceful_shutdown=10)
+    else:
+        mcp.run(transport="http", host=HOST, port=PORT)
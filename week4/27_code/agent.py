@@ -3,7 +3,11 @@
 # agent.py
 
 from langchain.agents import create_agent
+from langchain.agents.middleware import dynamic_prompt, ModelRequest
+from skill_bundle import SkillBundle
 from skill_engine import SkillEngine
+from skill_executor import SkillProcessPool
+from skill_retriever import SkillRetriever
 from langchain.chat_models import init_chat_model
 import os
 from dotenv import load_dotenv
@@ -12,40 +16,40 @@ load_dotenv()
 
 assert os.getenv("OPENAI_API_KEY"), "请先配置 OPENAI_API_KEY"
 
-engine = SkillEngine("skills")
+# 技能库编译成一个索引文件，启动时一次读入，只有改动过的文件才重新解析
+bundle = SkillBundle.load("skills")
+print(f"[skills] bundle reused={bundle.stats['reused']} rebuilt={bundle.stats['rebuilt']}")
+# 技能脚本在常驻的工作进程里执行，慢的 / 卡死的脚本不会拖住 Agent
+# 工作进程在第一轮对话开始时才在后台启动并预先导入脚本，和模型生成第一次回复并行，不拖慢 Agent 启动
+skill_pool = SkillProcessPool(
+    max_workers=int(os.getenv("SKILL_WORKERS", "4")),
+    default_timeout=float(os.getenv("SKILL_TIMEOUT", "30")),
+    memory_mb=int(os.getenv("SKILL_MEMORY_MB", "1024")),
+    preload=[(f"{skill}_{path.stem}", path) for skill, path, _ in bundle.scripts])
+engine = SkillEngine("skills", bundle=bundle, executor=skill_pool)
 
 tools = engine.load_scripts_as_tools()
 
-skill_prompts = engine.load_all_skill_prompts()
+# 每轮只注入与用户问题最相关的技能指令，其余技能由模型通过工具按需加载
+# 向量模型在后台线程加载，不阻塞启动
+retriever = SkillRetriever(engine, top_k=int(os.getenv("SKILL_TOP_K", "2"))).start_indexing()
+tools.append(retriever.create_instruction_tool())
 
-templates_registry = engine.load_templates()
 
-system_prompt = f"""
-你是一个具备多项专业技能的 Agent。
+@dynamic_prompt
+def skill_prompt(request: ModelRequest) -> str:
+    skill_pool.start()
+    query = next((m.content for m in reversed(request.messages) if m.type == "human"), "")
+    prompt, report = retriever.build_system_prompt(str(query))
+    print(f"[skills] {report.summary()}")
+    return prompt
 
-## 技能列表
-{list(skill_prompts.keys())}
-
-## 技能指令集
-{skill_prompts}
-
-## 可用输出模板 (Resources)
-当技能指令要求使用特定模板时，请参考以下内容进行填充。
-{templates_registry}
-
-## 工作要求
-1. 识别用户意图是否匹配上述技能。
-2. 如果匹配，严格执行指令中的步骤。
-3. 最终输出必须严格遵循对应技能 resources/templates 下的格式。
-"""
-
-print(system_prompt)
 
 llm = init_chat_model(
                 model="qwen-plus",
                 model_provider="openai",
                 api_key=os.getenv("OPENAI_API_KEY"),
-                base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
+                base_url=os.getenv("OPENAI_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
             )
 
 
@@ -53,7 +57,7 @@ agent = create_agent(
     tools=tools,
     model=llm,
     debug=True,
-    system_prompt=system_prompt,
+    middleware=[skill_prompt],
 )
 
 if __name__ == "__main__":
@@ -61,3 +65,4 @@ if __name__ == "__main__":
         {"messages": [{"role": "user", "content": "帮我总结这篇文章：https://platform.claude.com/docs/en/agents-and-tools/agent-skills/overview"}]}
     )
     print(result['messages'][-1].content)
+    print(f"[skills] requests={retriever.requests} total_tokens_saved={retriever.total_tokens_saved}")
@@ -0,0 +1,116 @@
+"""
+web-article-summarizer 的 fetch_content 抓取耗时对比
+
+在本地启动一个提供大页面的 HTTP 服务（支持 ETag / Last-Modified 和 keep-alive），对比：
+- baseline：原来的写法，每次 requests.get 新建连接、完整下载、html.parser 解析
+- cold：共用连接池、流式下载，本地缓存为空
+- warm：缓存已存在，条件请求命中 304，不再下载和解析
+    python bench_fetch_content.py --pages 5 --paragraphs 20000 --rounds 3
+"""
+import argparse
+import hashlib
+import importlib.util
+import os
+import tempfile
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+from bs4 import BeautifulSoup
+
+SCRIPT = Path(__file__).resolve().parent / "skills" / "web-article-summarizer" / "resources" / "scripts" / "fetch_content.py"
+
+
+def make_page(i: int, paragraphs: int) -> bytes:
+    body = "".join(f"<p>第 {i} 篇文章的第 {n} 段，包含一些正文内容 lorem ipsum dolor sit amet。</p>"
+                   f"<script>var x{n} = {n};</script>" for n in range(paragraphs))
+    return f"<html><head><meta charset='utf-8'><title>page {i}</title></head><body><nav>menu</nav>{body}</body></html>".encode()
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    pages: dict[str, bytes] = {}
+    last_modified = formatdate(usegmt=True)
+    bytes_sent = 0
+
+    def do_GET(self):
+        page = self.pages.get(self.path)
+        if page is None:
+            self.send_error(404)
+            return
+        etag = f'"{hashlib.sha256(page).hexdigest()[:16]}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(page)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.last_modified)
+        self.end_headers()
+        self.wfile.write(page)
+        PageHandler.bytes_sent += len(page)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def baseline_run(url: str) -> str:
+    """原来的 fetch_content.run"""
+    resp = requests.get(url, headers={"User-Agent": "Mozilla/5.0 AgentSkillBot"}, timeout=15)
+    resp.raise_for_status()
+    soup = BeautifulSoup(resp.text, "html.parser")
+    for tag in soup(["script", "style", "nav", "footer", "header", "aside"]):
+        tag.decompose()
+    return "\n".join(p.get_text().strip() for p in soup.find_all("p"))
+
+
+def load_fetch_content(cache_dir: str):
+    os.environ["FETCH_CACHE_DIR"] = cache_dir
+    spec = importlib.util.spec_from_file_location("fetch_content", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(label: str, fn, urls: list[str], rounds: int) -> list[str]:
+    PageHandler.bytes_sent = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        results = [fn(url) for url in urls]
+    elapsed = time.perf_counter() - start
+    calls = rounds * len(urls)
+    print(f"{label:<10} {elapsed / calls * 1000:8.1f}ms/call  downloaded={PageHandler.bytes_sent / 1024 / 1024:7.1f}MB")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark fetch_content against a local HTTP server")
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--paragraphs", type=int, default=20000, help="每个页面的段落数，决定页面大小")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    PageHandler.pages = {f"/article/{i}": make_page(i, args.paragraphs) for i in range(args.pages)}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls = [f"http://127.0.0.1:{server.server_port}/article/{i}" for i in range(args.pages)]
+    page_mb = len(next(iter(PageHandler.pages.values()))) / 1024 / 1024
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        fetch_content = load_fetch_content(cache_dir)
+        print(f"pages={args.pages} page_size={page_mb:.1f}MB rounds={args.rounds} parser={fetch_content.PARSER}")
+        expected = measure("baseline", baseline_run, urls, args.rounds)
+        # cold 每轮都清空缓存，只体现连接复用和解析器的差异
+        def cold(url):
+            fetch_content._cache_path(url).unlink(missing_ok=True)
+            return fetch_content.run(url)
+        assert measure("cold", cold, urls, args.rounds) == expected
+        assert measure("warm", fetch_content.run, urls, args.rounds) == expected
+
+    server.shutdown()
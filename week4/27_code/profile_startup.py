@@ -0,0 +1,81 @@
+"""
+Agent 启动耗时分析
+
+在一个全新的子进程里执行 import agent（技能包加载、工作进程池、工具注册、技能检索器、create_agent 全部包含在内），
+同时用 python -X importtime 记录每个模块的导入耗时、用 cProfile 统计启动阶段各个步骤在主线程上的耗时，
+输出总耗时、各阶段耗时和导入最慢的模块：
+    python profile_startup.py --top 15
+    SKILL_WORKERS=8 python profile_startup.py   # 环境变量原样传给 agent.py
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+
+# (文件名, 函数名) -> 阶段说明；后台线程里的工作（向量模型、工作进程启动）不在主线程上，不计入
+PHASES = {
+    ("skill_bundle.py", "load"): "SkillBundle.load 技能包加载",
+    ("skill_executor.py", "__init__"): "SkillProcessPool 创建",
+    ("skill_executor.py", "start"): "SkillProcessPool.start",
+    ("skill_engine.py", "load_scripts_as_tools"): "技能脚本注册为工具",
+    ("skill_retriever.py", "__init__"): "SkillRetriever 创建",
+    ("skill_retriever.py", "start_indexing"): "SkillRetriever.start_indexing",
+    ("base.py", "init_chat_model"): "init_chat_model",
+    ("factory.py", "create_agent"): "create_agent",
+}
+
+STARTUP_CODE = """
+import cProfile, json, os, pstats, time
+profiler = cProfile.Profile()
+start = time.perf_counter()
+profiler.enable()
+import agent
+profiler.disable()
+wall = time.perf_counter() - start
+phases = {}
+for (filename, _, name), (_, _, _, cumulative, _) in pstats.Stats(profiler).stats.items():
+    key = os.path.basename(filename) + ":" + name
+    phases[key] = max(phases.get(key, 0.0), cumulative)
+print(json.dumps({"wall": wall, "phases": phases}))
+"""
+
+
+def profile() -> tuple[float, dict[str, float], list[tuple[int, str]]]:
+    """返回 (import agent 耗时, {阶段: 耗时}, [(模块自身导入耗时 us, 模块名)])"""
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    # agent.py 导入时检查 API Key，只做启动分析不会真的调用模型
+    env.setdefault("OPENAI_API_KEY", "sk-profile")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", STARTUP_CODE],
+                          cwd=HERE, env=env, capture_output=True, text=True, check=True)
+    result = json.loads(proc.stdout.splitlines()[-1])
+    phases = {label: result["phases"].get(f"{filename}:{name}", 0.0) for (filename, name), label in PHASES.items()}
+
+    # 每行格式：import time:  self [us] | cumulative | imported package
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|", 2)
+        modules.append((int(self_us), name.strip()))
+    return result["wall"], phases, modules
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="startup profile of import agent")
+    parser.add_argument("--top", type=int, default=10, help="列出导入最慢的前几个模块")
+    args = parser.parse_args()
+
+    wall, phases, modules = profile()
+    total = sum(us for us, _ in modules) / 1e6
+    # cProfile 本身有开销，各阶段耗时只用于相互比较
+    print(f"import agent: wall={wall:6.2f}s imports={total:6.2f}s modules={len(modules)}")
+    print("phases (main thread, cProfile):")
+    for label, seconds in phases.items():
+        print(f"    {seconds * 1000:8.1f}ms  {label}")
+    print("slowest imports:")
+    for us, name in sorted(modules, reverse=True)[:args.top]:
+        print(f"    {us / 1000:8.1f}ms  {name}")
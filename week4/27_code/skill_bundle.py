@@ -0,0 +1,141 @@
+"""
+编译后的技能包
+
+SkillEngine 的每个方法都会重新扫描 skills 目录、重新读取每个文件，read_skill_template 每次调用也要读盘。
+这里把整个技能库编译成一个索引文件（默认是 skills 目录旁边的 skills.bundle.json），包含：
+- 每个技能 SKILL.md 的 front matter 和指令正文
+- 所有模板的内容
+- 所有脚本 run 函数的参数和 docstring（只解析语法树，不导入脚本）
+
+启动时一次读入整个索引文件，然后只对目录做 stat：mtime 和大小都没变的文件直接复用索引里的结果，
+只有改动过的文件才重新读取和解析，新增 / 删除的文件同步更新，有变化时再把索引写回磁盘。
+    python skill_bundle.py          # 编译（增量）并打印统计
+    python skill_bundle.py --force  # 忽略已有索引，全部重新编译
+"""
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+from skill_engine import ScriptSpec, parse_script_spec, parse_skill_md
+
+BUNDLE_FORMAT = 1
+
+
+class SkillBundle:
+    def __init__(self, skills_root: str | Path = "skills", path: str | Path | None = None):
+        """
+        - path: 索引文件路径，默认为 skills 目录旁边的 <目录名>.bundle.json
+        """
+        self.skills_root = Path(skills_root)
+        self.path = Path(path) if path else self.skills_root.with_name(f"{self.skills_root.name}.bundle.json")
+        # 相对路径 -> {"mtime_ns", "size", "kind", "data"}，增量编译以文件为单位
+        self.entries: dict[str, dict] = {}
+        self.metas: dict[str, dict] = {}
+        self.instructions: dict[str, str] = {}
+        self.templates: dict[str, dict[str, str]] = {}
+        self.scripts: list[tuple[str, Path, ScriptSpec]] = []
+        self.stats = {"reused": 0, "rebuilt": 0, "removed": 0, "seconds": 0.0}
+
+    @classmethod
+    def load(cls, skills_root: str | Path = "skills", path: str | Path | None = None) -> "SkillBundle":
+        bundle = cls(skills_root, path)
+        bundle.refresh()
+        return bundle
+
+    def refresh(self, force: bool = False) -> bool:
+        """把索引同步到目录的当前状态，返回是否有文件发生变化"""
+        start = time.perf_counter()
+        if not self.entries and not force:
+            self.entries = self._read_index()
+
+        entries, reused, rebuilt = {}, 0, 0
+        for relpath, kind in self._scan():
+            path = self.skills_root / relpath
+            st = path.stat()
+            old = self.entries.get(relpath)
+            if not force and old and old["mtime_ns"] == st.st_mtime_ns and old["size"] == st.st_size:
+                entries[relpath] = old
+                reused += 1
+                continue
+            entries[relpath] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "kind": kind,
+                                "data": self._compile(kind, path)}
+            rebuilt += 1
+
+        removed = len(self.entries.keys() - entries.keys())
+        changed = force or rebuilt > 0 or removed > 0
+        self.entries = entries
+        self._build_views()
+        if changed:
+            self._write_index()
+        self.stats = {"reused": reused, "rebuilt": rebuilt, "removed": removed,
+                      "seconds": time.perf_counter() - start}
+        return changed
+
+    def _scan(self):
+        """和 SkillEngine 扫描同样的文件，但只列出路径，不读取内容"""
+        for skill in sorted(p for p in self.skills_root.iterdir() if p.is_dir()):
+            if (skill / "SKILL.md").exists():
+                yield f"{skill.name}/SKILL.md", "skill"
+            for template in sorted((skill / "resources" / "templates").glob("*.*")):
+                yield template.relative_to(self.skills_root).as_posix(), "template"
+            for script in sorted((skill / "resources" / "scripts").glob("*.py")):
+                yield script.relative_to(self.skills_root).as_posix(), "script"
+
+    @staticmethod
+    def _compile(kind: str, path: Path):
+        content = path.read_text(encoding="utf-8")
+        if kind == "skill":
+            meta, instructions = parse_skill_md(content)
+            return {"meta": meta, "instructions": instructions}
+        if kind == "template":
+            return content
+        spec = parse_script_spec(content, str(path))
+        return spec.to_dict() if spec else None
+
+    def _build_views(self):
+        """把按文件存放的条目整理成 SkillEngine 需要的结构"""
+        self.metas, self.instructions, self.templates, self.scripts = {}, {}, {}, []
+        for relpath, entry in self.entries.items():
+            skill_name, _, rest = relpath.partition("/")
+            data = entry["data"]
+            if entry["kind"] == "skill":
+                self.metas[skill_name] = data["meta"]
+                self.instructions[skill_name] = data["instructions"]
+            elif entry["kind"] == "template":
+                self.templates.setdefault(skill_name, {})[Path(rest).name] = data
+            elif data is not None:
+                self.scripts.append((skill_name, self.skills_root / relpath, ScriptSpec.from_dict(data)))
+
+    def _read_index(self) -> dict:
+        try:
+            # 整个索引一次读入
+            index = json.loads(self.path.read_bytes())
+        except (OSError, ValueError):
+            return {}
+        if index.get("format") != BUNDLE_FORMAT:
+            return {}
+        return index["entries"]
+
+    def _write_index(self):
+        # 先写临时文件再替换，其他进程不会读到写了一半的索引
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({"format": BUNDLE_FORMAT, "entries": self.entries}, ensure_ascii=False),
+                       encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="compile the skills directory into one index file")
+    parser.add_argument("--skills", default="skills")
+    parser.add_argument("--output", help="索引文件路径，默认为 <skills>.bundle.json")
+    parser.add_argument("--force", action="store_true", help="忽略已有索引，全部重新编译")
+    args = parser.parse_args()
+
+    bundle = SkillBundle(args.skills, args.output)
+    bundle.refresh(force=args.force)
+    stats = bundle.stats
+    print(f"{bundle.path}: skills={len(bundle.metas)} templates={sum(map(len, bundle.templates.values()))} "
+          f"scripts={len(bundle.scripts)} reused={stats['reused']} rebuilt={stats['rebuilt']} "
+          f"removed={stats['removed']} in {stats['seconds'] * 1000:.1f}ms")
@@ -1,25 +1,98 @@
+import ast
 import importlib.util
+import threading
+from dataclasses import dataclass
 from pathlib import Path
-from langchain_core.tools import Tool, StructuredTool
-from pydantic import BaseModel, Field
+from langchain_core.tools import Tool, StructuredTool, ToolException
+from pydantic import BaseModel, Field, create_model
+
+from skill_executor import SkillProcessPool, SkillWorkerError
+
+# 脚本参数注解到 Python 类型的映射，没有注解或无法识别的都按 str 处理
+_ANNOTATION_TYPES = {"str": str, "int": int, "float": float, "bool": bool}
 
 
 class TemplateInput(BaseModel):
     skill_name: str = Field(description="技能文件夹的名称，例如 'web-researcher'")
     template_name: str = Field(description="模板文件的全名，例如 'report_template.md'")
     
+
+@dataclass(frozen=True)
+class ScriptSpec:
+    """不导入脚本、只靠语法树读出来的 run 函数信息"""
+    params: tuple[tuple[str, type, object], ...]  # (参数名, 类型, 默认值)，没有默认值时为 ...
+    doc: str | None
+
+    def to_dict(self) -> dict:
+        """转成可以写进 JSON 的形式（技能包里保存的就是它）"""
+        return {"params": [{"name": name, "type": annotation.__name__, "required": default is ...,
+                            "default": None if default is ... else default}
+                           for name, annotation, default in self.params],
+                "doc": self.doc}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ScriptSpec":
+        params = tuple((p["name"], _ANNOTATION_TYPES.get(p["type"], str), ... if p["required"] else p["default"])
+                       for p in data["params"])
+        return cls(params=params, doc=data["doc"])
+
+
+def parse_skill_md(content: str) -> tuple[dict, str]:
+    """拆分 SKILL.md，返回 (front matter, 指令正文)"""
+    meta = {}
+    if content.startswith("---"):
+        front_matter = content.split("---", 2)[1]
+        for line in front_matter.strip().splitlines():
+            key, _, value = line.partition(":")
+            meta[key.strip()] = value.strip()
+    body = content.split("---", 2)[2].strip() if "---" in content else content
+    return meta, body
+
+
+def read_script_spec(script_path: Path) -> ScriptSpec | None:
+    return parse_script_spec(script_path.read_text(encoding="utf-8"), str(script_path))
+
+
+def parse_script_spec(source: str, filename: str = "<skill script>") -> ScriptSpec | None:
+    """解析脚本的语法树，读取顶层 run 函数的参数和 docstring；没有 run 函数时返回 None"""
+    tree = ast.parse(source, filename=filename)
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == "run":
+            args = node.args.posonlyargs + node.args.args
+            defaults = [...] * (len(args) - len(node.args.defaults)) + [
+                d.value if isinstance(d, ast.Constant) else None for d in node.args.defaults]
+            params = tuple(
+                (arg.arg,
+                 _ANNOTATION_TYPES.get(arg.annotation.id, str) if isinstance(arg.annotation, ast.Name) else str,
+                 default)
+                for arg, default in zip(args, defaults))
+            return ScriptSpec(params=params, doc=ast.get_docstring(node))
+    return None
+
+
 class SkillEngine:
-    def __init__(self, skills_root="skills"):
+    def __init__(self, skills_root="skills", lazy: bool = True, bundle=None,
+                 executor: SkillProcessPool | None = None):
+        """
+        - lazy: 为 True 时启动阶段只解析脚本的语法树，第一次调用工具时才导入脚本（以及 requests、bs4 等依赖）；
+          为 False 时保持原来的行为，启动时就导入所有脚本
+        - bundle: 预编译的技能包（见 skill_bundle.py）。提供时技能指令、模板和脚本信息都从内存读取，不再扫描目录
+        - executor: 提供时技能脚本在它的工作进程里执行（带超时和内存上限），不再阻塞 Agent 进程
+        """
         self.skills_root = Path(skills_root)
+        self.lazy = lazy
+        self.bundle = bundle
+        self.executor = executor
+        self._modules = {}
+        self._import_lock = threading.Lock()
 
     def load_skill_prompt(self, skill_path: Path) -> str:
-        content = skill_path.read_text(encoding="utf-8")
-        if "---" in content:
-            return content.split("---", 2)[2].strip()
-        return content
+        return parse_skill_md(skill_path.read_text(encoding="utf-8"))[1]
 
     def load_templates(self):
         """扫描所有技能下的 templates 文件夹，返回 {skill_name: {template_name: content}}"""
+        if self.bundle is not None:
+            return self.bundle.templates
         all_templates = {}
         for skill in self.skills_root.iterdir():
             template_dir = skill / "resources" / "templates"
@@ -36,6 +109,13 @@ class SkillEngine:
 
     def load_scripts_as_tools(self):
         tools = []
+        if self.bundle is not None and self.lazy:
+            # 脚本的参数和 docstring 已经在技能包里，不需要再读取脚本文件
+            for skill_name, script_path, spec in self.bundle.scripts:
+                tools.append(self._build_script_tool(skill_name, script_path, spec))
+            tools.append(self._create_template_reader_tool())
+            return tools
+
         # 基础脚本工具加载
         for skill in self.skills_root.iterdir():
             scripts_dir = skill / "resources" / "scripts"
@@ -52,6 +132,12 @@ class SkillEngine:
 
     def _create_template_reader_tool(self):
         def read_template(skill_name: str, template_name: str) -> str:
+            if self.bundle is not None:
+                # 模板内容已经随技能包加载进内存
+                content = self.bundle.templates.get(skill_name, {}).get(template_name)
+                if content is not None:
+                    return content
+                return f"错误：在技能 '{skill_name}' 中找不到模板 '{template_name}'。"
             path = self.skills_root / skill_name / "resources" / "templates" / template_name
             if path.exists():
                 return path.read_text(encoding="utf-8")
@@ -66,6 +152,50 @@ class SkillEngine:
         )
 
     def _load_script_as_tool(self, skill_name: str, script_path: Path):
+        if not self.lazy:
+            return self._load_script_as_tool_eager(skill_name, script_path)
+
+        spec = read_script_spec(script_path)
+        if spec is None:
+            return None
+        return self._build_script_tool(skill_name, script_path, spec)
+
+    def _build_script_tool(self, skill_name: str, script_path: Path, spec: ScriptSpec):
+        module_name = f"{skill_name}_{script_path.stem}"
+
+        def run(*args, **kwargs):
+            if self.executor is None:
+                return self._import_script(module_name, script_path).run(*args, **kwargs)
+            try:
+                return self.executor.run_script(module_name, script_path, args, kwargs)
+            except SkillWorkerError as e:
+                # 超时、报错、超出内存都以工具错误的形式返回给模型，Agent 继续运行
+                raise ToolException(str(e)) from e
+
+        description = spec.doc or f"执行技能 {skill_name} 的脚本: {script_path.stem}"
+        if len(spec.params) <= 1:
+            # 单参数脚本和原来一样用 Tool，模型传入的字符串直接作为 run 的参数
+            return Tool(name=module_name, func=run, description=description, handle_tool_error=True)
+
+        args_schema = create_model(f"{module_name}_input",
+                                   **{name: (annotation, default) for name, annotation, default in spec.params})
+        return StructuredTool.from_function(func=run, name=module_name, description=description,
+                                            args_schema=args_schema, handle_tool_error=True)
+
+    def _import_script(self, module_name: str, script_path: Path):
+        """第一次调用时才真正导入脚本，之后复用同一个模块对象"""
+        module = self._modules.get(module_name)
+        if module is None:
+            with self._import_lock:
+                module = self._modules.get(module_name)
+                if module is None:
+                    spec = importlib.util.spec_from_file_location(module_name, script_path)
+                    module = importlib.util.module_from_spec(spec)
+                    spec.loader.exec_module(module)
+                    self._modules[module_name] = module
+        return module
+
+    def _load_script_as_tool_eager(self, skill_name: str, script_path: Path):
         module_name = f"{skill_name}_{script_path.stem}"
         spec = importlib.util.spec_from_file_location(module_name, script_path)
         module = importlib.util.module_from_spec(spec)
@@ -80,7 +210,24 @@ class SkillEngine:
             description=f"执行技能 {skill_name} 的脚本: {script_path.stem}"
         )
 
+    def load_skill_meta(self, skill_path: Path) -> dict:
+        """读取 SKILL.md 的 front matter（name / description / version 等）"""
+        return parse_skill_md(skill_path.read_text(encoding="utf-8"))[0]
+
+    def load_all_skill_meta(self):
+        """返回 {skill_name: front matter}，skill_name 为技能文件夹名"""
+        if self.bundle is not None:
+            return self.bundle.metas
+        metas = {}
+        for skill in self.skills_root.iterdir():
+            skill_md = skill / "SKILL.md"
+            if skill_md.exists():
+                metas[skill.name] = self.load_skill_meta(skill_md)
+        return metas
+
     def load_all_skill_prompts(self):
+        if self.bundle is not None:
+            return self.bundle.instructions
         prompts = {}
         for skill in self.skills_root.iterdir():
             skill_md = skill / "SKILL.md"
@@ -0,0 +1,287 @@
+"""
+在独立的工作进程中执行技能脚本
+
+原来技能脚本的 run 直接在 Agent 进程里执行：一个慢的 fetch_content.run 会卡住整个 Agent，
+卡死的脚本永远不会返回，内存暴涨的脚本会拖垮 Agent 本身。这里改为：
+- 启动固定数量的常驻工作进程，脚本在工作进程里导入一次、之后一直复用（不重复导入 requests、bs4 等）；
+  工作进程按需在后台线程里启动和预加载，不拖慢 Agent 启动，调用只在还没有可用的工作进程时等待
+- 工作进程数就是并发上限，多个互不依赖的技能调用可以同时执行
+- 每次调用有超时，超时后直接杀掉对应的工作进程并补一个新的，其他调用不受影响
+- 每个工作进程有内存上限（RLIMIT_AS，Linux 下生效），超出时只有这个调用失败
+
+工作进程是单独启动的 python skill_executor.py --worker，只导入标准库，
+通过 stdin / stdout 上的 pickle 消息通信（脚本自己的 print 输出会被转到 stderr）。
+依赖 select 等待管道，仅支持 Linux / macOS。
+
+    python skill_executor.py   # 演示：并发、超时、内存上限
+"""
+import argparse
+import atexit
+import importlib.util
+import os
+import pickle
+import queue
+import select
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+
+class SkillWorkerError(RuntimeError):
+    """脚本执行失败、超时或工作进程异常退出"""
+
+
+class _Worker:
+    def __init__(self, memory_mb: int, preload: list[tuple[str, str]], timeout: float):
+        cmd = [sys.executable, str(Path(__file__).resolve()), "--worker", "--memory-mb", str(memory_mb)]
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        for module_name, script_path in preload:
+            # 预先导入脚本，第一次调用时不用再等依赖加载；失败不影响启动，调用时会再报出来
+            try:
+                self.request(pickle.dumps(("import", module_name, script_path, (), {})), timeout)
+            except TimeoutError:
+                self.kill()
+                raise SkillWorkerError(f"预加载脚本 {module_name} 超时") from None
+            except BaseException:
+                self.kill()
+                raise
+
+    def request(self, payload: bytes, timeout: float | None):
+        """发送一条已经序列化好的请求并等待结果，返回 (ok, 结果或错误信息)"""
+        # 一次写入完整的消息，不会因为序列化到一半失败而在管道里留下半条消息
+        self.proc.stdin.write(payload)
+        self.proc.stdin.flush()
+        ready, _, _ = select.select([self.proc.stdout], [], [], timeout)
+        if not ready:
+            raise TimeoutError
+        try:
+            return pickle.load(self.proc.stdout)
+        except EOFError:
+            raise SkillWorkerError(f"工作进程异常退出（exit code {self.proc.wait()}）") from None
+
+    def kill(self):
+        self.proc.kill()
+        self.proc.wait()
+
+    def close(self):
+        self.proc.stdin.close()
+        try:
+            self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.kill()
+
+
+class SkillProcessPool:
+    def __init__(self, max_workers: int = 4, default_timeout: float = 30.0, timeouts: dict[str, float] | None = None,
+                 memory_mb: int = 1024, preload: list[tuple[str, Path]] | None = None):
+        """
+        - max_workers: 常驻工作进程数，也就是同时执行的技能脚本数上限
+        - default_timeout: 默认的单次调用超时（秒）
+        - timeouts: 按模块名（即工具名）单独设置的超时，例如 {"web-article-summarizer_fetch_content": 60}
+        - memory_mb: 每个工作进程的内存上限，0 表示不限制
+        - preload: 启动工作进程时预先导入的脚本 [(模块名, 脚本路径)]
+        构造时不启动任何进程：调用 start() 在后台启动，或者第一次 run_script 时自动启动
+        """
+        self.max_workers = max_workers
+        self.default_timeout = default_timeout
+        self.timeouts = timeouts or {}
+        self.memory_mb = memory_mb
+        self.preload = [(name, str(path)) for name, path in preload or []]
+        self.restarts = 0
+        # 空闲的工作进程；None 表示这个位置的进程启动失败了，取到它的调用负责重新启动
+        self._idle: queue.Queue[_Worker | None] = queue.Queue()
+        self._workers: list[_Worker] = []
+        self._lock = threading.Lock()
+        self._started = False
+        self._closed = False
+        atexit.register(self.shutdown)
+
+    def start(self):
+        """在后台线程里启动工作进程并预加载脚本，立即返回；重复调用无效果"""
+        with self._lock:
+            if self._started:
+                return self
+            self._started = True
+        threading.Thread(target=self._start_workers, name="skill-workers", daemon=True).start()
+        return self
+
+    def timeout_for(self, module_name: str) -> float:
+        return self.timeouts.get(module_name, self.default_timeout)
+
+    def run_script(self, module_name: str, script_path: Path, args: tuple = (), kwargs: dict | None = None):
+        """在空闲的工作进程里执行脚本的 run(*args, **kwargs)，没有空闲进程时排队等待"""
+        # 先序列化参数：参数无法序列化时直接报错，不占用也不会弄坏工作进程
+        try:
+            payload = pickle.dumps(("run", module_name, str(script_path), args, kwargs or {}))
+        except Exception as e:
+            raise SkillWorkerError(f"技能脚本 {module_name} 的参数无法序列化：{e!r}") from None
+        self.start()
+        worker = self._take_worker()
+        timeout = self.timeout_for(module_name)
+        try:
+            ok, result = worker.request(payload, timeout)
+        except TimeoutError:
+            # 没法让卡住的脚本自己停下来，只能杀掉整个工作进程
+            self._replace(worker)
+            raise SkillWorkerError(f"技能脚本 {module_name} 执行超时（{timeout} 秒）") from None
+        except (SkillWorkerError, OSError) as e:
+            self._replace(worker)
+            raise SkillWorkerError(f"技能脚本 {module_name} 执行失败：{e}") from None
+        except BaseException:
+            # 其他异常（比如结果无法反序列化、被中断）之后进程状态未知，同样换掉
+            self._replace(worker)
+            raise
+        self._idle.put(worker)
+        if not ok:
+            raise SkillWorkerError(f"技能脚本 {module_name} 执行失败：{result}")
+        return result
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.close()
+
+    def _take_worker(self) -> _Worker:
+        worker = self._idle.get()
+        if worker is None:
+            try:
+                worker = self._spawn()
+            except BaseException:
+                self._idle.put(None)
+                raise
+        return worker
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self.memory_mb, self.preload, self.default_timeout)
+        with self._lock:
+            if self._closed:
+                worker.close()
+                raise SkillWorkerError("工作进程池已关闭")
+            self._workers.append(worker)
+        return worker
+
+    def _start_workers(self):
+        # 先单独启动一个，让第一个调用尽快有进程可用，其余的再并行启动
+        self._fill_slot()
+        for i in range(1, self.max_workers):
+            threading.Thread(target=self._fill_slot, name=f"skill-worker-{i}", daemon=True).start()
+
+    def _fill_slot(self):
+        """启动一个工作进程放进空闲队列；失败时放入 None，由下一个取到它的调用重试"""
+        if self._closed:
+            return
+        try:
+            worker = self._spawn()
+        except Exception as e:
+            if self._closed:
+                return
+            print(f"[skill pool] 工作进程启动失败：{e!r}", file=sys.stderr)
+            worker = None
+        self._idle.put(worker)
+
+    def _replace(self, worker: _Worker):
+        worker.kill()
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+            self.restarts += 1
+        # 新进程在后台启动，不让这次失败的调用再多等一个进程的启动时间
+        threading.Thread(target=self._fill_slot, name="skill-worker-restart", daemon=True).start()
+
+
+def _worker_main(memory_mb: int):
+    # 协议使用原来的 stdout，脚本里的 print 统一转到 stderr，不会破坏消息
+    channel_out = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    channel_in = sys.stdin.buffer
+
+    if memory_mb:
+        try:
+            import resource
+            limit = memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError) as e:
+            print(f"[skill worker] 无法设置内存上限：{e!r}", file=sys.stderr)
+
+    modules = {}
+    while True:
+        try:
+            kind, module_name, script_path, args, kwargs = pickle.load(channel_in)
+        except EOFError:
+            return
+        try:
+            module = modules.get(module_name)
+            if module is None:
+                spec = importlib.util.spec_from_file_location(module_name, script_path)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                modules[module_name] = module
+            response = (True, module.run(*args, **kwargs) if kind == "run" else None)
+        except MemoryError:
+            response = (False, f"超出内存上限（{memory_mb} MB）")
+        except BaseException as e:
+            response = (False, repr(e))
+        # 先完整序列化再写入，序列化失败时管道里不会留下半条消息
+        try:
+            data = pickle.dumps(response)
+        except Exception as e:
+            # 返回值无法序列化
+            data = pickle.dumps((False, f"无法返回结果：{e!r}"))
+        channel_out.write(data)
+        channel_out.flush()
+
+
+DEMO_SCRIPT = '''
+import time
+
+def run(task: str) -> str:
+    if task == "hang":
+        time.sleep(3600)
+    if task == "oom":
+        data = bytearray(2 * 1024 ** 3)
+    if task == "fail":
+        raise ValueError("bad input")
+    print("this goes to stderr, not into the protocol")
+    time.sleep(1)
+    return f"done: {task}"
+'''
+
+
+def _demo():
+    from concurrent.futures import ThreadPoolExecutor
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        script = Path(tmp) / "demo.py"
+        script.write_text(DEMO_SCRIPT, encoding="utf-8")
+        pool = SkillProcessPool(max_workers=4, default_timeout=3, memory_mb=512, preload=[("demo", script)]).start()
+
+        def call(task):
+            start = time.perf_counter()
+            try:
+                result = pool.run_script("demo", script, (task,))
+            except SkillWorkerError as e:
+                result = str(e)
+            return f"{task:<6} {time.perf_counter() - start:5.2f}s  {result}"
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(8) as threads:
+            lines = list(threads.map(call, ["a", "b", "c", "hang", "oom", "fail", "d", "e"]))
+        print("\n".join(lines))
+        print(f"total {time.perf_counter() - start:.2f}s with 4 workers, restarts={pool.restarts}")
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="skill script worker pool")
+    parser.add_argument("--worker", action="store_true", help="以工作进程身份运行（由 SkillProcessPool 启动）")
+    parser.add_argument("--memory-mb", type=int, default=0)
+    args = parser.parse_args()
+    if args.worker:
+        _worker_main(args.memory_mb)
+    else:
+        _demo()
@@ -0,0 +1,218 @@
+"""
+按需披露技能（progressive disclosure）
+
+原来的 agent.py 把所有技能的 SKILL.md 正文和所有模板都拼进系统提示词，
+技能越多，每次请求的 prompt token、费用和首 token 延迟就越高。这里改成三层：
+1. 技能目录：所有技能的名称 + 一句话描述，始终放在系统提示词里（很短）
+2. 技能指令：用 sentence-transformers 把每个技能的 front matter 预先向量化，
+   每轮只把和用户问题最相关的 top-k 个技能的完整指令放进系统提示词；
+   其他技能需要时由模型调用 load_skill_instructions 工具按需加载
+3. 模板：只列出模板名，需要时用 read_skill_template 工具读取
+"""
+import threading
+from dataclasses import dataclass
+from functools import cached_property
+
+import numpy as np
+import tiktoken
+from langchain_core.tools import StructuredTool
+from pydantic import BaseModel, Field
+
+from skill_engine import SkillEngine
+
+PROMPT_HEADER = """
+你是一个具备多项专业技能的 Agent。
+"""
+
+PROMPT_FOOTER = """
+## 工作要求
+1. 识别用户意图是否匹配上述技能。
+2. 如果匹配，严格执行指令中的步骤；技能指令不在上面时，先调用 load_skill_instructions 加载。
+3. 最终输出必须严格遵循对应技能 resources/templates 下的格式，模板内容用 read_skill_template 读取。
+"""
+
+# 原来 agent.py 的写法：全部技能指令 + 全部模板，用来计算节省了多少 token
+FULL_PROMPT_TEMPLATE = """
+你是一个具备多项专业技能的 Agent。
+
+## 技能列表
+{skill_names}
+
+## 技能指令集
+{skill_prompts}
+
+## 可用输出模板 (Resources)
+当技能指令要求使用特定模板时，请参考以下内容进行填充。
+{templates}
+
+## 工作要求
+1. 识别用户意图是否匹配上述技能。
+2. 如果匹配，严格执行指令中的步骤。
+3. 最终输出必须严格遵循对应技能 resources/templates 下的格式。
+"""
+
+
+class SkillNameInput(BaseModel):
+    skill_name: str = Field(description="技能文件夹的名称，例如 'web-article-summarizer'")
+
+
+def estimate_tokens(text: str) -> int:
+    """没有 tiktoken 编码表时的粗略估计：中日韩字符每个约 1 个 token，其余约 4 个字符 1 个 token"""
+    cjk = sum(1 for ch in text if ord(ch) >= 0x2E80)
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+@dataclass
+class PromptReport:
+    skills: list[tuple[str, float]] | None  # 选中的技能及相似度，None 表示检索不可用、注入了全部技能
+    prompt_tokens: int
+    full_prompt_tokens: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.full_prompt_tokens - self.prompt_tokens
+
+    def summary(self) -> str:
+        if self.skills is None:
+            selected = "全部（检索不可用）"
+        else:
+            selected = ", ".join(f"{name}({score:.2f})" for name, score in self.skills) or "无"
+        return (f"skills=[{selected}] prompt_tokens={self.prompt_tokens} "
+                f"full_prompt_tokens={self.full_prompt_tokens} saved={self.tokens_saved}")
+
+
+class SkillRetriever:
+    def __init__(self, engine: SkillEngine, model_name: str = "paraphrase-multilingual-MiniLM-L12-v2",
+                 top_k: int = 2, min_score: float = 0.3, encoding: str = "cl100k_base"):
+        """
+        - model_name: 技能描述大多是中文，默认使用多语言的向量模型
+        - top_k: 每轮最多注入多少个技能的完整指令
+        - min_score: 相似度低于该值的技能不注入，闲聊时系统提示词里只有技能目录
+        - encoding: 统计 token 数用的 tiktoken 编码，只用于估算节省量；第一次统计时才加载，
+          加载失败（比如离线环境下载不了编码表）时按字符数估算
+        """
+        self.engine = engine
+        self.model_name = model_name
+        self.top_k = top_k
+        self.min_score = min_score
+        self.encoding_name = encoding
+        self.metas = engine.load_all_skill_meta()
+        self.instructions = engine.load_all_skill_prompts()
+        self.templates = engine.load_templates()
+        self.names = list(self.metas)
+        self.total_tokens_saved = 0
+        self.requests = 0
+        self._encoder = None
+        self._embeddings = None
+        self._index_thread: threading.Thread | None = None
+        self._index_error: Exception | None = None
+        self._last: tuple[str, str, PromptReport] | None = None
+        self._lock = threading.Lock()
+
+    @cached_property
+    def encoding(self):
+        try:
+            return tiktoken.get_encoding(self.encoding_name)
+        except Exception as e:
+            print(f"[skills] tiktoken 编码表不可用，按字符数估算 token：{e!r}")
+            return None
+
+    @cached_property
+    def full_prompt_tokens(self) -> int:
+        return self.count_tokens(FULL_PROMPT_TEMPLATE.format(
+            skill_names=list(self.instructions.keys()), skill_prompts=self.instructions, templates=self.templates))
+
+    def build_index(self):
+        """把所有技能的 name + description 一次性向量化，查询时只需要编码用户问题"""
+        texts = [f"{name}: {meta.get('name', '')} {meta.get('description', '')}" for name, meta in self.metas.items()]
+        self._embeddings = self._encode(texts) if texts else np.zeros((0, 1), dtype=np.float32)
+        return self
+
+    def start_indexing(self):
+        """在后台线程里加载向量模型并建索引，不拖慢 Agent 启动；第一次检索时如果还没建好再等待"""
+        self._index_thread = threading.Thread(target=self._build_index_safely, name="skill-index", daemon=True)
+        self._index_thread.start()
+        return self
+
+    def _build_index_safely(self):
+        # tiktoken 编码表也可能要下载，顺便在后台加载好
+        self.full_prompt_tokens
+        try:
+            self.build_index()
+        except Exception as e:
+            # 向量模型不可用（没有安装、离线下载失败等）时退回原来的做法：注入全部技能指令
+            self._index_error = e
+            print(f"[skills] 技能索引不可用，注入全部技能指令：{e!r}")
+
+    def retrieve(self, query: str) -> list[tuple[str, float]] | None:
+        """返回 [(技能名, 余弦相似度)]，按相似度从高到低，最多 top_k 个；索引不可用时返回 None"""
+        if self._index_thread is not None:
+            self._index_thread.join()
+        elif self._embeddings is None and self._index_error is None:
+            self._build_index_safely()
+        if self._index_error is not None:
+            return None
+        if not self.names or not query.strip():
+            return []
+        scores = self._embeddings @ self._encode([query])[0]
+        order = np.argsort(-scores)[: self.top_k]
+        return [(self.names[i], float(scores[i])) for i in order if scores[i] >= self.min_score]
+
+    def build_system_prompt(self, query: str) -> tuple[str, PromptReport]:
+        """
+        根据用户问题组装系统提示词，返回 (提示词, token 统计)
+        同一轮对话里模型会被调用多次（工具调用前后），问题不变时直接复用上一次的结果
+        """
+        with self._lock:
+            if self._last is not None and self._last[0] == query:
+                return self._last[1], self._last[2]
+
+        skills = self.retrieve(query)
+        selected = set(self.names) if skills is None else {name for name, _ in skills}
+        catalog = "\n".join(f"- {name}: {meta.get('description', '')}" for name, meta in self.metas.items())
+        instructions = "\n\n".join(f"### {name}\n{self.instructions[name]}" for name in self.names
+                                   if name in selected and name in self.instructions)
+        templates = "\n".join(f"- {name}: {', '.join(files)}" for name, files in self.templates.items())
+        prompt = (f"{PROMPT_HEADER}\n## 技能目录\n{catalog}\n\n"
+                  f"## 已加载的技能指令\n{instructions or '（无，需要时调用 load_skill_instructions 加载）'}\n\n"
+                  f"## 可用输出模板 (Resources)\n{templates}\n{PROMPT_FOOTER}")
+
+        report = PromptReport(skills=skills, prompt_tokens=self.count_tokens(prompt),
+                              full_prompt_tokens=self.full_prompt_tokens)
+        with self._lock:
+            self._last = (query, prompt, report)
+            self.requests += 1
+            self.total_tokens_saved += report.tokens_saved
+        return prompt, report
+
+    def create_instruction_tool(self) -> StructuredTool:
+        def load_skill_instructions(skill_name: str) -> str:
+            if skill_name in self.instructions:
+                return self.instructions[skill_name]
+            return f"错误：找不到技能 '{skill_name}'，可用技能：{self.names}"
+
+        return StructuredTool.from_function(
+            func=load_skill_instructions,
+            name="load_skill_instructions",
+            description="加载某个技能的完整指令。当用户意图匹配技能目录中的某个技能、但它的指令还没有出现在系统提示词中时使用。",
+            args_schema=SkillNameInput,
+        )
+
+    def count_tokens(self, text: str) -> int:
+        if self.encoding is None:
+            return estimate_tokens(text)
+        return len(self.encoding.encode(text))
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
+        if self._encoder is None:
+            # sentence-transformers 导入很慢，第一次用到时再加载
+            from sentence_transformers import SentenceTransformer
+            self._encoder = SentenceTransformer(self.model_name)
+        return self._encoder.encode(texts, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+
+if __name__ == "__main__":
+    retriever = SkillRetriever(SkillEngine("skills")).start_indexing()
+    for question in ["帮我总结这篇文章：https://example.com/post", "今天心情不错，随便聊聊"]:
+        _, report = retriever.build_system_prompt(question)
+        print(f"{question}\n    {report.summary()}")
@@ -1,26 +1,110 @@
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
 import requests
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 AgentSkillBot"
+}
+# 单个页面最多下载的字节数，超出部分直接丢弃
+MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(5 * 1024 * 1024)))
+CACHE_DIR = Path(os.getenv("FETCH_CACHE_DIR", Path(__file__).resolve().parent / ".fetch_cache"))
+# lxml 是 C 实现，比纯 Python 的 html.parser 快得多，没装时退回 html.parser
+PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+# 所有调用共用一个连接池，同一站点的连接可以复用（keep-alive），不用每次重新握手
+session = requests.Session()
+session.headers.update(HEADERS)
+session.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=16))
+session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16))
+
+
+def _cache_path(url: str) -> Path:
+    return CACHE_DIR / f"{hashlib.sha256(url.encode()).hexdigest()[:32]}.json"
+
+
+def _load_cache(url: str) -> dict | None:
+    try:
+        entry = json.loads(_cache_path(url).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return entry if entry.get("url") == url else None
 
-def run(url: str) -> str:
-    headers = {
-        "User-Agent": "Mozilla/5.0 AgentSkillBot"
-    }
-    resp = requests.get(url, headers=headers, timeout=15)
-    resp.raise_for_status()
 
-    soup = BeautifulSoup(resp.text, "html.parser")
+def _save_cache(url: str, resp: requests.Response, text: str):
+    validators = {k: resp.headers[h] for k, h in (("etag", "ETag"), ("last_modified", "Last-Modified"))
+                  if h in resp.headers}
+    if not validators:
+        # 服务器没有提供 ETag / Last-Modified，无法做条件请求，不缓存
+        return
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # 每次写入使用独立的临时文件，多个线程 / 进程同时缓存同一个 URL 也不会互相覆盖
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=CACHE_DIR, suffix=".tmp", delete=False) as tmp:
+        json.dump({"url": url, **validators, "text": text}, tmp, ensure_ascii=False)
+    try:
+        os.replace(tmp.name, _cache_path(url))
+    except OSError:
+        os.unlink(tmp.name)
+        raise
+
+
+def _read_body(resp: requests.Response) -> bytes:
+    """流式读取响应体，最多读 MAX_BYTES 字节"""
+    chunks, size = [], 0
+    for chunk in resp.iter_content(chunk_size=64 * 1024):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= MAX_BYTES:
+            break
+    return b"".join(chunks)[:MAX_BYTES]
+
+
+def extract_text(html: bytes, encoding: str | None = None) -> str:
+    soup = BeautifulSoup(html, PARSER, from_encoding=encoding)
 
     # 移除无关元素
     for tag in soup(["script", "style", "nav", "footer", "header", "aside"]):
         tag.decompose()
 
-    text = "\n".join(p.get_text().strip() for p in soup.find_all("p"))
+    return "\n".join(p.get_text().strip() for p in soup.find_all("p"))
+
+
+def run(url: str) -> str:
+    """抓取网页并提取正文段落文本，参数为网页 URL"""
+    cached = _load_cache(url)
+    headers = {}
+    if cached:
+        # 条件请求：内容没变时服务器返回 304，不需要重新下载和解析
+        if "etag" in cached:
+            headers["If-None-Match"] = cached["etag"]
+        if "last_modified" in cached:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    with session.get(url, headers=headers, timeout=15, stream=True) as resp:
+        if cached and resp.status_code == 304:
+            return cached["text"]
+        resp.raise_for_status()
+        body = _read_body(resp)
+        # 只有响应头里明确声明了 charset 才使用，否则交给解析器根据 <meta> 判断
+        encoding = resp.encoding if "charset" in resp.headers.get("Content-Type", "") else None
+        text = extract_text(body, encoding)
+        try:
+            _save_cache(url, resp, text)
+        except Exception as e:
+            # 缓存只是优化，写不进去也要正常返回抓取结果
+            print(f"[fetch_content] 写入缓存失败：{e!r}", file=sys.stderr)
     return text
 
 
 
 if __name__ == "__main__":
-    import sys
     url = sys.argv[1]
     content = run(url)
     print(content[:5000])  # 防止极端长度